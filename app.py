@@ -1,11 +1,28 @@
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import json
 import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from utils.document_processor import DocumentProcessor
 from utils.ai_service import AIService
-from utils.webhook_handler import WebhookHandler
+from utils.webhook_handler import WebhookHandler, DEFAULT_WEBHOOK_URL
 from utils.excel_converter import ExcelConverter
+from utils.questionnaire import Questionnaire
+from utils.exporters import available_formats, get_exporter
+from utils.extraction_cache import ExtractionCache
+from utils.text_compactor import TextCompactor
+from utils.embedding_cache import EmbeddingCache
+from utils.response_cache import ResponseCache
+from utils.clients import ClientRegistry
+from utils.rate_limiter import RateLimiter
+from utils.job_executor import JobExecutor, STATUS_DONE as JOB_DONE, STATUS_ERROR as JOB_ERROR
+from utils.session_memory import SpilledText, pack_embedding, session_memory_usage
+from utils.run_store import RunStore, STAGE_EXTRACT, STAGE_ANALYZE, STAGE_REVIEW, STAGE_GENERATE, STAGE_EDIT
+from utils.vector_index import VectorIndex
+from utils.questionnaire_cache import QuestionnaireCache
+from utils.make_receiver import ResultStore, CallbackReceiver, STATUS_PENDING, STATUS_DONE
 
 # Configuración de la página
 st.set_page_config(
@@ -39,14 +56,212 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def get_extraction_cache():
+    """Cache de extracción compartido entre todas las sesiones"""
+    return ExtractionCache()
+
+@st.cache_resource
+def get_embedding_cache():
+    """Cache de embeddings compartido entre todas las sesiones"""
+    return EmbeddingCache()
+
+@st.cache_resource
+def get_response_cache():
+    """Cache de respuestas del LLM compartido entre todas las sesiones"""
+    return ResponseCache()
+
+@st.cache_resource
+def get_client_registry():
+    """Clientes OpenAI y HTTP compartidos entre todas las sesiones"""
+    return ClientRegistry(
+        openai_api_key=st.secrets.get("OPENAI_API_KEY", ""),
+        pool_size=int(st.secrets.get("HTTP_POOL_SIZE", 20)),
+        connect_timeout=float(st.secrets.get("HTTP_CONNECT_TIMEOUT", 10)),
+        read_timeout=float(st.secrets.get("HTTP_READ_TIMEOUT", 180))
+    )
+
+@st.cache_resource
+def get_make_result_store():
+    """Resultados de Make compartidos entre sesiones (y receptor de callbacks si está configurado)"""
+    store = ResultStore()
+    callback_port = int(st.secrets.get("MAKE_CALLBACK_PORT", 0))
+    if callback_port:
+        CallbackReceiver(
+            store,
+            host=st.secrets.get("MAKE_CALLBACK_HOST", "127.0.0.1"),
+            port=callback_port
+        ).start()
+    return store
+
+@st.cache_resource
+def get_make_executor():
+    """Pool de hilos para llamadas síncronas a Make en segundo plano"""
+    return ThreadPoolExecutor(max_workers=int(st.secrets.get("MAKE_WORKERS", 8)))
+
+@st.cache_resource
+def get_brief_index():
+    """Índice local de briefs anteriores compartido entre sesiones"""
+    return VectorIndex()
+
+@st.cache_resource
+def get_questionnaire_cache():
+    """Cache de cuestionarios de briefs casi idénticos compartido entre sesiones"""
+    return QuestionnaireCache(threshold=float(st.secrets.get("QUESTIONNAIRE_CACHE_THRESHOLD", 0.95)))
+
+def get_webhook_handler():
+    """Construye un WebhookHandler sobre los recursos compartidos"""
+    registry = get_client_registry()
+    return WebhookHandler(
+        session=registry.http_session(),
+        timeout=registry.timeout,
+        webhook_url=st.secrets.get("WEBHOOK_URL", DEFAULT_WEBHOOK_URL),
+        result_store=get_make_result_store(),
+        executor=get_make_executor(),
+        callback_url=st.secrets.get("MAKE_CALLBACK_URL", None),
+        embedding_encoding=st.secrets.get("MAKE_EMBEDDING_ENCODING", None),
+        compress=str(st.secrets.get("MAKE_GZIP", "")).strip().lower() in ("1", "true", "yes"),
+        rate_limiter=get_rate_limiter()
+    )
+
+# Intervalo de sondeo del resultado de Make (segundos)
+POLL_INTERVAL = 2
+
+@st.cache_resource
+def get_rate_limiter():
+    """Limitador de peticiones a OpenAI y Make compartido entre todas las sesiones"""
+    limits = {}
+    for endpoint in ("chat", "embeddings", "make"):
+        prefix = f"RATE_{endpoint.upper()}"
+        if st.secrets.get(f"{prefix}_RPM"):
+            limits[endpoint] = (
+                int(st.secrets.get(f"{prefix}_RPM")),
+                int(st.secrets.get(f"{prefix}_TPM", 0)) or None,
+                int(st.secrets.get(f"{prefix}_CONCURRENCY", 4))
+            )
+    return RateLimiter(limits)
+
+@st.cache_resource
+def get_job_executor():
+    """Ejecutor de trabajos en segundo plano compartido entre sesiones"""
+    return JobExecutor(max_workers=int(st.secrets.get("JOB_WORKERS", 8)))
+
+@st.cache_resource
+def get_run_store():
+    """Ejecuciones del flujo persistidas en disco, compartidas entre sesiones"""
+    return RunStore()
+
+def run_owner():
+    """Propietario de las ejecuciones guardadas: el usuario autenticado o, sin login, la sesión"""
+    try:
+        email = st.user.get("email")
+    except Exception:
+        email = None
+    return f"user:{email}" if email else f"session:{session_key()}"
+
+def session_key():
+    """Identificador de la sesión emitido por el servidor
+    
+    No se toma de la URL: un enlace compartido no da acceso a los trabajos
+    ni a las ejecuciones de otra sesión. Sin login, una recarga empieza una
+    sesión nueva.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        return ctx.session_id
+    if 'session_key' not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex
+    return st.session_state.session_key
+
+def restore_session():
+    """Recupera trabajos en curso tras una recarga o reconexión del navegador"""
+    if st.session_state.get('restored'):
+        return
+    st.session_state.restored = True
+    
+    if st.session_state.step != 1:
+        return
+    
+    # Etapas ya completadas de la ejecución indicada en la URL
+    run_id = st.query_params.get("run")
+    if run_id:
+        restore_run(run_id)
+    
+    # El resultado de Make solo se recupera si la ejecución es del propietario
+    processing_id = st.query_params.get("pid")
+    pid_run_id = get_run_store().find_by_processing_id(processing_id, run_owner()) if processing_id else None
+    if pid_run_id and not st.session_state.json_response \
+            and get_make_result_store().get(processing_id) is not None:
+        if pid_run_id != st.session_state.get('run_id'):
+            restore_run(pid_run_id)
+        st.session_state.processing_id = processing_id
+        st.session_state.step = 4
+    elif run_id and get_job_executor().get(processing_job_key(run_id)) is not None:
+        st.session_state.run_id = run_id
+        st.session_state.step = 2
+
+def restore_run(run_id, step=None):
+    """Carga en la sesión la salida de las etapas completadas de una ejecución"""
+    stages = get_run_store().load(run_id, owner=run_owner())
+    if not stages:
+        return False
+    
+    st.session_state.run_id = run_id
+    st.query_params["run"] = run_id
+    st.session_state.full_text = SpilledText()
+    st.session_state.metadata = {}
+    st.session_state.embedding = None
+    st.session_state.processing_id = None
+    st.session_state.pop('questionnaire_match', None)
+    set_json_response(None)
+    
+    # Sin metadatos, el procesamiento se reanuda desde el texto ya extraído
+    if STAGE_ANALYZE in stages:
+        extract = stages.get(STAGE_EXTRACT, {})
+        st.session_state.full_text = SpilledText(extract.get("full_text", ""))
+        st.session_state.compaction_report = extract.get("compaction_report", {})
+        st.session_state.metadata = stages[STAGE_ANALYZE]["metadata"]
+        st.session_state.embedding = pack_embedding(stages[STAGE_ANALYZE]["embedding"])
+    if STAGE_REVIEW in stages:
+        st.session_state.metadata = stages[STAGE_REVIEW]["metadata"]
+    
+    generated = stages.get(STAGE_EDIT) or stages.get(STAGE_GENERATE)
+    if generated:
+        set_json_response(generated["json_response"])
+        st.session_state.processing_id = stages.get(STAGE_GENERATE, {}).get("processing_id")
+    
+    if step is None:
+        if generated:
+            step = 5
+        elif STAGE_REVIEW in stages:
+            step = 4
+        elif STAGE_ANALYZE in stages:
+            step = 3
+        else:
+            step = 2
+    st.session_state.step = step
+    return True
+
+def save_run_stage(stage, value, label=None):
+    """Persiste la salida de una etapa de la ejecución actual"""
+    run_id = st.session_state.get('run_id')
+    if not run_id:
+        return
+    try:
+        get_run_store().save_stage(run_id, stage, value, label=label)
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo guardar el progreso: {str(e)}")
+
 # Inicializar session state
 def init_session_state():
     defaults = {
         'step': 1,
-        'full_text': '',
+        'full_text': SpilledText(),
         'metadata': {},
         'embedding': None,
         'json_response': None,
+        'questionnaire': None,
+        'questionnaire_version': 0,
         'processing_id': None,
         'excel_ready': False
     }
@@ -56,6 +271,7 @@ def init_session_state():
 
 def main():
     init_session_state()
+    restore_session()
     
     # CSS personalizado con colores Atlantia
     st.markdown("""
@@ -482,6 +698,20 @@ def step_upload_documents():
     else:
         st.info("📋 Selecciona al menos un documento para continuar")
     
+    # Ejecuciones anteriores que pueden reabrirse sin recalcular nada
+    runs = get_run_store().recent(run_owner())
+    if runs:
+        with st.expander("🗂️ Reabrir una ejecución anterior"):
+            for run in runs:
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    updated = datetime.fromtimestamp(run["updated_at"]).strftime("%Y-%m-%d %H:%M")
+                    st.write(f"**{run['label'] or run['run_id'][:12]}** — etapa: {run['stage']} ({updated})")
+                with col2:
+                    if st.button("📂 Reabrir", key=f"reopen_{run['run_id']}"):
+                        restore_run(run["run_id"])
+                        st.rerun()
+    
     st.markdown('</div>', unsafe_allow_html=True)
 
 def step_process_documents():
@@ -489,10 +719,21 @@ def step_process_documents():
     st.markdown('<div class="step-container">', unsafe_allow_html=True)
     st.subheader("🔄 Paso 2: Procesamiento Automático")
     
-    # Auto-procesar al llegar a este paso
-    if st.session_state.full_text == "":
-        with st.spinner("🔄 Procesando documentos..."):
-            process_documents()
+    keep_polling = False
+    
+    # Auto-procesar al llegar a este paso (en segundo plano)
+    if not st.session_state.full_text:
+        # Documentos ya procesados en una ejecución anterior: reutilizarla
+        if not get_job_executor().get(processing_job_key(current_run_id())) and resume_stored_run():
+            st.rerun()
+        job = start_processing_job()
+        if job is None:
+            st.warning("⚠️ No hay documentos cargados. Vuelve al paso 1.")
+            if st.button("⬅️ Cargar Documentos"):
+                st.session_state.step = 1
+                st.rerun()
+        else:
+            keep_polling = render_processing_job(job)
     
     if st.session_state.full_text:
         st.success("✅ Documentos procesados exitosamente")
@@ -501,50 +742,230 @@ def step_process_documents():
         col1, col2, col3 = st.columns(3)
         with col1:
             st.metric("📄 Caracteres extraídos", len(st.session_state.full_text))
+            compaction_report = st.session_state.get('compaction_report', {})
+            if compaction_report:
+                saved = sum(item['tokens_ahorrados'] for item in compaction_report.values())
+                st.caption(f"✂️ {saved} tokens ahorrados por compactación")
         with col2:
             st.metric("🧠 Metadatos extraídos", len(st.session_state.metadata))
         with col3:
-            st.metric("🔗 Embedding generado", "✅" if st.session_state.embedding else "❌")
+            st.metric("🔗 Embedding generado", "✅" if st.session_state.embedding is not None else "❌")
         
         # Vista previa del texto
         with st.expander("👀 Vista previa del contenido extraído"):
-            st.text_area("Contenido", st.session_state.full_text[:500] + "...", height=150, disabled=True)
+            st.text_area("Contenido", st.session_state.full_text.preview(500) + "...", height=150, disabled=True)
+        
+        # Estadísticas de los caches compartidos
+        with st.expander("⚡ Estadísticas de cache"):
+            st.write("**Compactación por documento:**", st.session_state.get('compaction_report', {}))
+            st.write("**Extracción de texto:**", get_extraction_cache().stats())
+            st.write("**Embeddings:**", get_embedding_cache().stats())
+            st.write("**Metadatos (LLM):**", get_response_cache().stats())
+            st.write("**Cuestionarios reutilizados:**", get_questionnaire_cache().stats())
+            st.write("**Llamadas a APIs:**", get_rate_limiter().stats())
+            
+            usage = session_memory_usage(st.session_state)
+            st.write(f"**Memoria de la sesión:** {sum(usage.values()) / 1024:.1f} KB")
+            st.write({key: f"{size / 1024:.1f} KB" for key, size in usage.items()})
+            if st.session_state.full_text.spilled:
+                st.caption(f"💾 Texto extraído en disco ({st.session_state.full_text.disk_bytes / 1024:.1f} KB)")
+        
+        if st.button("🔄 Reprocesar sin cache", use_container_width=True):
+            if start_processing_job(force_refresh=True) is not None:
+                st.session_state.full_text = SpilledText()
+            st.rerun()
         
         if st.button("➡️ Revisar Metadatos", type="primary", use_container_width=True):
             st.session_state.step = 3
             st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Volver a consultar el trabajo sin bloquear la interfaz
+    if keep_polling:
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
 
-def process_documents():
-    """Procesa los documentos cargados"""
-    try:
-        processor = DocumentProcessor()
-        ai_service = AIService()
-        
-        # Extraer texto
-        full_text = ""
-        
-        if hasattr(st.session_state, 'brief_file') and st.session_state.brief_file:
-            text1 = processor.extract_text(st.session_state.brief_file)
-            full_text += text1
-        
-        if hasattr(st.session_state, 'ko_file') and st.session_state.ko_file:
-            text2 = processor.extract_text(st.session_state.ko_file)
-            full_text += "\n" + text2
-        
-        st.session_state.full_text = full_text
-        
-        # Extraer metadatos con IA
-        metadata = ai_service.extract_metadata(full_text)
-        st.session_state.metadata = metadata
-        
-        # Generar embedding
-        embedding = ai_service.generate_embedding(full_text)
-        st.session_state.embedding = embedding
-        
-    except Exception as e:
-        st.error(f"❌ Error durante el procesamiento: {str(e)}")
+def processing_job_key(run_id):
+    """Clave del trabajo de procesamiento de una ejecución, limitada a su propietario"""
+    return f"{run_owner()}:{run_id}:process"
+
+def current_run_id():
+    """run_id de los documentos cargados (hash de su contenido) o el de la sesión"""
+    documents = [
+        (role, st.session_state[role].getvalue())
+        for role in ('brief_file', 'ko_file') if st.session_state.get(role)
+    ]
+    if documents:
+        return RunStore.make_run_id(documents, run_owner())
+    return st.session_state.get('run_id')
+
+def resume_stored_run():
+    """Carga los resultados guardados si estos documentos ya se procesaron"""
+    run_id = current_run_id()
+    if not run_id:
+        return False
+    stages = get_run_store().load(run_id, owner=run_owner())
+    if not stages or STAGE_ANALYZE not in stages:
+        return False
+    if not restore_run(run_id, step=2):
+        return False
+    release_uploads()
+    return True
+
+def start_processing_job(force_refresh=False):
+    """Lanza (o recupera) el procesamiento de documentos en segundo plano"""
+    executor = get_job_executor()
+    run_id = current_run_id()
+    if not run_id:
+        return None
+    
+    key = processing_job_key(run_id)
+    job = executor.get(key)
+    if job is not None and not force_refresh:
+        return job
+    
+    brief_file = st.session_state.get('brief_file')
+    ko_file = st.session_state.get('ko_file')
+    run_store = get_run_store()
+    run_store.open_run(run_id, owner=run_owner(), label=", ".join(f.name for f in (brief_file, ko_file) if f))
+    if force_refresh:
+        # Sin los archivos (ya liberados) se conserva el texto y se rehace el análisis
+        run_store.reset(run_id, STAGE_EXTRACT if brief_file or ko_file else STAGE_ANALYZE)
+    elif not brief_file and not ko_file and STAGE_EXTRACT not in (run_store.load(run_id) or {}):
+        return None
+    st.session_state.run_id = run_id
+    st.query_params["run"] = run_id
+    
+    processor = DocumentProcessor(
+        cache=get_extraction_cache(),
+        pdf_workers=int(st.secrets.get("PDF_WORKERS", 0)) or None
+    )
+    ai_service = AIService(
+        embedding_cache=get_embedding_cache(),
+        response_cache=get_response_cache(),
+        client=get_client_registry().openai_client(),
+        rate_limiter=get_rate_limiter()
+    )
+    
+    if force_refresh:
+        executor.discard(key)
+    return executor.submit(
+        key, run_owner(), process_documents,
+        processor, ai_service, brief_file, ko_file, force_refresh,
+        run_store=run_store, run_id=run_id
+    )
+
+def render_processing_job(job):
+    """Muestra el progreso del procesamiento; devuelve True si sigue en curso"""
+    snapshot = job.snapshot()
+    
+    if snapshot["status"] == JOB_DONE:
+        result = snapshot["result"]
+        st.session_state.full_text = SpilledText(result["full_text"])
+        st.session_state.compaction_report = result["compaction_report"]
+        st.session_state.metadata = result["metadata"]
+        st.session_state.embedding = pack_embedding(result["embedding"])
+        get_job_executor().discard(job.key)
+        release_uploads()
+        st.rerun()
+    
+    if snapshot["status"] == JOB_ERROR:
+        st.error(f"❌ Error durante el procesamiento: {snapshot['error']}")
+        if st.button("🔄 Reintentar procesamiento", use_container_width=True):
+            get_job_executor().discard(job.key)
+            st.rerun()
+        return False
+    
+    st.progress(snapshot["progress"], text=snapshot["message"] or "🔄 Procesando documentos...")
+    
+    # Metadatos que el modelo ya terminó de escribir
+    fields = snapshot["partial"].get("fields", {})
+    if fields:
+        st.markdown("**🧠 Metadatos detectados:**")
+        for key, value in fields.items():
+            if isinstance(value, list):
+                value = ", ".join(str(item) for item in value)
+            st.markdown(f"- **{key}:** {value if value not in ('', None) else '—'}")
+    return True
+
+def release_uploads():
+    """Libera los archivos subidos una vez extraído su texto"""
+    for key in ('brief_file', 'ko_file', 'brief_uploader', 'ko_uploader'):
+        st.session_state.pop(key, None)
+
+def process_documents(job, processor, ai_service, brief_file, ko_file, force_refresh=False,
+                      run_store=None, run_id=None):
+    """Procesa los documentos cargados (se ejecuta en un worker, sin llamadas a st)"""
+    stages = (run_store.load(run_id) or {}) if run_store else {}
+    
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        if STAGE_EXTRACT in stages:
+            # Reanudar desde el texto extraído en una ejecución anterior
+            full_text = stages[STAGE_EXTRACT]["full_text"]
+            compaction_report = stages[STAGE_EXTRACT]["compaction_report"]
+        else:
+            # Extraer texto de ambos documentos en paralelo
+            job.update(0.05, "📄 Extrayendo texto...")
+            brief_future = executor.submit(processor.extract_text, brief_file) if brief_file else None
+            ko_future = executor.submit(processor.extract_text, ko_file) if ko_file else None
+            
+            documents = []
+            labels = []
+            if brief_future:
+                documents.append(brief_future.result())
+                labels.append("Brief")
+            if ko_future:
+                documents.append(ko_future.result())
+                labels.append("KO")
+            
+            # Quitar encabezados, espacios y párrafos repetidos antes de pagar tokens
+            compacted, report = TextCompactor().compact(documents)
+            full_text = "\n".join(compacted)
+            compaction_report = dict(zip(labels, report))
+            if run_store:
+                run_store.save_stage(run_id, STAGE_EXTRACT, {
+                    "full_text": full_text,
+                    "compaction_report": compaction_report,
+                })
+        
+        # Metadatos y embedding no dependen entre sí: lanzarlos a la vez
+        job.update(0.3, "🧠 Extrayendo metadatos y generando embedding...")
+        embedding_future = executor.submit(ai_service.generate_embedding, full_text, raise_errors=True)
+        
+        fields = {}
+        
+        def publish_field(key, value):
+            fields[key] = value
+            job.update(min(0.3 + 0.04 * len(fields), 0.9), fields=dict(fields))
+        
+        # En este hilo st.error no se muestra: los errores terminan el trabajo con su causa real
+        try:
+            metadata = ai_service.extract_metadata(
+                full_text, force_refresh=force_refresh, on_field=publish_field, raise_errors=True
+            )
+        except Exception as e:
+            raise RuntimeError(f"no se pudieron extraer los metadatos: {e}") from e
+        try:
+            embedding = embedding_future.result()
+        except Exception as e:
+            raise RuntimeError(f"no se pudo generar el embedding: {e}") from e
+    
+    if not metadata:
+        raise RuntimeError("el modelo no devolvió metadatos")
+    
+    if run_store:
+        run_store.save_stage(run_id, STAGE_ANALYZE, {
+            "metadata": metadata,
+            "embedding": embedding,
+        }, label=metadata.get("nombre_proyecto") or None)
+    
+    return {
+        "full_text": full_text,
+        "compaction_report": compaction_report,
+        "metadata": metadata,
+        "embedding": embedding,
+    }
 
 def step_review_metadata():
     """Paso 3: Revisar metadatos"""
@@ -598,13 +1019,15 @@ def step_review_metadata():
                 "decisiones_a_tomar": decisiones_a_tomar,
                 "preguntas_negocio": [p.strip() for p in preguntas_negocio.split('\n') if p.strip()],
                 "hipotesis": metadata.get("hipotesis", ""),
-                "texto_preview": st.session_state.full_text[:500],
+                "texto_preview": st.session_state.full_text.preview(500),
                 "archivo_link": "",
                 "tiene_brief": metadata.get("tiene_brief", False),
                 "tiene_kickoff": metadata.get("tiene_kickoff", False)
             }
             
             st.session_state.metadata = updated_metadata
+            save_run_stage(STAGE_REVIEW, {"metadata": updated_metadata}, label=nombre_proyecto or None)
+            st.session_state.pop('questionnaire_match', None)
             st.session_state.step = 4
             st.rerun()
     
@@ -628,23 +1051,35 @@ def step_generate_questionnaire():
     with col3:
         st.metric("Marca", metadata.get("marca", "N/A"))
     
+    # Estudios anteriores más parecidos según el índice local
+    if st.session_state.embedding is not None:
+        similar = get_brief_index().search(st.session_state.embedding, k=5)
+        if similar:
+            with st.expander("🔎 Estudios similares anteriores"):
+                for score, record in similar:
+                    st.write(f"**{record.get('nombre_proyecto') or record.get('processing_id')}** "
+                             f"({record.get('marca', '')}, {record.get('tipo_estudio', '')}) — similitud {score:.2f}")
+    
+    keep_polling = False
+    
     # Botón de generación
     if not st.session_state.json_response:
-        if st.button("🚀 Generar Cuestionario con IA", type="primary", use_container_width=True):
-            generate_questionnaire()
+        if st.session_state.processing_id:
+            keep_polling = poll_questionnaire()
+        else:
+            offer_cached_questionnaire()
+            if st.button("🚀 Generar Cuestionario con IA", type="primary", use_container_width=True):
+                generate_questionnaire()
     else:
         st.success("✅ Cuestionario generado exitosamente")
         
         # Mostrar información del cuestionario
         try:
-            # Usar el método de limpieza del converter
-            converter = ExcelConverter()
-            data = converter.load_json_from_content(st.session_state.json_response)
-            questions = data.get('questions', [])
-            st.metric("📊 Total de preguntas generadas", len(questions))
+            questionnaire = get_questionnaire()
+            st.metric("📊 Total de preguntas generadas", len(questionnaire))
             
             with st.expander("👀 Vista previa del cuestionario"):
-                st.json(data['metadata'] if 'metadata' in data else {})
+                st.json(questionnaire.metadata or {})
         except:
             st.warning("⚠️ Respuesta generada, preparando para descarga...")
         
@@ -658,50 +1093,160 @@ def step_generate_questionnaire():
         st.rerun()
     
     st.markdown('</div>', unsafe_allow_html=True)
+    
+    # Volver a consultar el resultado sin bloquear la interfaz
+    if keep_polling:
+        time.sleep(POLL_INTERVAL)
+        st.rerun()
+
+def offer_cached_questionnaire():
+    """Ofrece reutilizar el cuestionario de un brief casi idéntico"""
+    if 'questionnaire_match' not in st.session_state:
+        match = None
+        if st.session_state.embedding is not None:
+            match = get_questionnaire_cache().lookup(st.session_state.embedding, st.session_state.metadata)
+        st.session_state.questionnaire_match = match
+    
+    match = st.session_state.questionnaire_match
+    if not match:
+        return
+    
+    score, processing_id, json_response = match
+    st.info(f"♻️ Existe un cuestionario de un brief casi idéntico ({processing_id}, similitud {score:.2f})")
+    if st.button("♻️ Usar cuestionario existente", use_container_width=True):
+        set_json_response(json_response)
+        st.session_state.processing_id = processing_id
+        save_run_stage(STAGE_GENERATE, {"processing_id": processing_id, "json_response": json_response})
+        st.rerun()
 
 def generate_questionnaire():
-    """Genera el cuestionario enviando datos a Make"""
+    """Envía el trabajo a Make sin esperar el cuestionario"""
     try:
-        webhook_handler = WebhookHandler()
+        webhook_handler = get_webhook_handler()
+        
+        # Generar ID único para el procesamiento
+        processing_id = f"quest_{uuid.uuid4().hex}"
+        
+        success, response = webhook_handler.submit_to_make(
+            st.session_state.embedding,
+            st.session_state.metadata,
+            processing_id
+        )
         
-        with st.spinner("🤖 Generando cuestionario con IA..."):
-            # Generar ID único para el procesamiento
-            processing_id = f"quest_{int(time.time())}"
+        if success:
             st.session_state.processing_id = processing_id
-            
-            # Enviar datos a Make y recibir respuesta
-            success, response = webhook_handler.send_to_make(
-                st.session_state.embedding,
-                st.session_state.metadata,
-                processing_id
-            )
-            
-            if success:
-                # Procesar la respuesta de Make
-                if isinstance(response, dict):
-                    # Ya es un diccionario JSON
-                    st.session_state.json_response = json.dumps(response)
-                elif isinstance(response, str):
-                    # Es una string, verificar si es JSON válido
-                    try:
-                        # Verificar que es JSON válido
-                        json.loads(response)
-                        st.session_state.json_response = response
-                    except json.JSONDecodeError:
-                        # Si no es JSON válido, usar como respuesta raw
-                        st.session_state.json_response = response
-                else:
-                    st.error("❌ Formato de respuesta inesperado de Make")
-                    return
-                
-                st.success("✅ Cuestionario generado con IA")
-                st.rerun()
-            else:
-                st.error(f"❌ Error al generar cuestionario: {response}")
+            # Guardar el ID en la URL para recuperar el resultado tras una recarga
+            st.query_params["pid"] = processing_id
+            if st.session_state.get('run_id'):
+                get_run_store().set_processing_id(st.session_state.run_id, processing_id)
+            st.rerun()
+        else:
+            st.error(f"❌ Error al generar cuestionario: {response}")
                 
     except Exception as e:
         st.error(f"❌ Error inesperado: {str(e)}")
-        
+
+def poll_questionnaire():
+    """Consulta el resultado del trabajo en Make; devuelve True si sigue pendiente"""
+    processing_id = st.session_state.processing_id
+    webhook_handler = get_webhook_handler()
+    result = webhook_handler.receive_from_make(processing_id)
+    
+    if result is None:
+        st.warning("⚠️ No se encontró el trabajo en curso. Vuelve a generar el cuestionario.")
+        st.session_state.processing_id = None
+        return False
+    
+    status, response = result
+    
+    if status == STATUS_PENDING:
+        st.info(f"🤖 Generando cuestionario con IA... (ID: {processing_id})")
+        return True
+    
+    webhook_handler.result_store.discard(processing_id)
+    
+    if status == STATUS_DONE:
+        if store_make_response(response):
+            save_run_stage(STAGE_GENERATE, {
+                "processing_id": processing_id,
+                "json_response": st.session_state.json_response
+            })
+            index_brief(processing_id)
+            if st.session_state.embedding is not None:
+                get_questionnaire_cache().put(
+                    st.session_state.embedding,
+                    st.session_state.metadata,
+                    processing_id,
+                    st.session_state.json_response
+                )
+            st.success("✅ Cuestionario generado con IA")
+            st.rerun()
+    else:
+        st.error(f"❌ Error al generar cuestionario: {response}")
+    
+    st.session_state.processing_id = None
+    return False
+
+def index_brief(processing_id):
+    """Añade el brief actual al índice local de estudios"""
+    if st.session_state.embedding is None:
+        return
+    metadata = st.session_state.metadata
+    try:
+        get_brief_index().add(st.session_state.embedding, {
+            "processing_id": processing_id,
+            "nombre_proyecto": metadata.get("nombre_proyecto", ""),
+            "marca": metadata.get("marca", ""),
+            "tipo_estudio": metadata.get("tipo_estudio", ""),
+            "industria": metadata.get("industria", ""),
+            "created_at": datetime.now().isoformat()
+        })
+    except Exception as e:
+        st.warning(f"⚠️ No se pudo indexar el brief: {str(e)}")
+
+def store_make_response(response):
+    """Guarda la respuesta de Make en el session state"""
+    if isinstance(response, dict):
+        # Ya es un diccionario JSON: no hace falta volver a parsearlo
+        set_json_response(json.dumps(response), parsed=Questionnaire.from_make(response))
+    elif isinstance(response, str):
+        # Es una string (JSON o respuesta raw)
+        set_json_response(response)
+    else:
+        st.error("❌ Formato de respuesta inesperado de Make")
+        return False
+    return True
+        
+def set_json_response(json_response, parsed=None):
+    """Reemplaza la respuesta de Make e invalida el cuestionario parseado"""
+    st.session_state.json_response = json_response
+    st.session_state.questionnaire = parsed
+    st.session_state.questionnaire_version += 1
+
+def get_questionnaire():
+    """Devuelve el Questionnaire, parseando json_response solo una vez por versión"""
+    if st.session_state.questionnaire is None:
+        converter = ExcelConverter()
+        data = converter.load_json_from_content(st.session_state.json_response)
+        st.session_state.questionnaire = Questionnaire.from_make(data)
+    return st.session_state.questionnaire
+
+def update_questionnaire(questionnaire):
+    """Guarda un cuestionario modificado como nueva versión"""
+    st.session_state.questionnaire = questionnaire
+    st.session_state.questionnaire_version += 1
+
+def questionnaire_derived(name, build):
+    """Memoiza un valor derivado del cuestionario para la versión actual"""
+    version = st.session_state.questionnaire_version
+    derived = st.session_state.get('questionnaire_derived')
+    if derived is None or derived['version'] != version:
+        derived = {'version': version}
+        st.session_state.questionnaire_derived = derived
+    if name not in derived:
+        derived[name] = build(get_questionnaire())
+    return derived[name]
+
 def step_edit_questionnaire():
     """Paso 5: Editar cuestionario de forma interactiva"""
     st.markdown('<div class="step-container">', unsafe_allow_html=True)
@@ -713,16 +1258,14 @@ def step_edit_questionnaire():
     
     try:
         # Cargar datos actuales
-        converter = ExcelConverter()
-        data = converter.load_json_from_content(st.session_state.json_response)
-        questions = data.get('questions', [])
+        questionnaire = get_questionnaire()
         
-        if not questions:
+        if not len(questionnaire):
             st.error("❌ No se encontraron preguntas para editar.")
             return
         
         # Información del cuestionario
-        st.markdown(f"### 📊 Editando {len(questions)} preguntas")
+        st.markdown(f"### 📊 Editando {len(questionnaire)} preguntas")
         
         # Botones de acción superiores
         col1, col2, col3 = st.columns([2, 1, 1])
@@ -740,18 +1283,8 @@ def step_edit_questionnaire():
         # Editor de preguntas con st.data_editor
         st.markdown("### ✏️ Editor de Preguntas")
         
-        # Preparar datos para el editor
-        edit_data = []
-        for i, q in enumerate(questions):
-            edit_data.append({
-                'ID': q.get('No. Pregunta', f'P{i+1}'),
-                'Módulo': q.get('KPI base o Modulo', ''),
-                'Pregunta': q.get('Pregunta', ''),
-                'Tipo': q.get('Tipo de respuesta', ''),
-                'Opciones': q.get('Opciones de respuesta', '').replace('\r\n', ' | '),
-                'Indicador': q.get('Indicador', ''),
-                'Lógica': q.get('Lógica de programación', '')
-            })
+        # Preparar datos para el editor (una vez por versión del cuestionario)
+        edit_data = questionnaire_derived('editor_frame', Questionnaire.to_editor_frame)
         
         # Configuración de columnas para el editor
         column_config = {
@@ -790,7 +1323,7 @@ def step_edit_questionnaire():
         
         # Botón para guardar cambios
         if st.button("💾 Guardar Cambios", type="primary", use_container_width=True):
-            save_questionnaire_changes(edited_data, data)
+            save_questionnaire_changes(edited_data, questionnaire)
             st.success("✅ Cambios guardados exitosamente")
             st.rerun()
         
@@ -799,15 +1332,15 @@ def step_edit_questionnaire():
         with col1:
             st.metric("📊 Total preguntas", len(edited_data))
         with col2:
-            tipos_unicos = len(set(row['Tipo'] for row in edited_data if row['Tipo']))
+            tipos_unicos = edited_data.loc[edited_data['Tipo'] != '', 'Tipo'].nunique()
             st.metric("🎯 Tipos únicos", tipos_unicos)
         with col3:
-            modulos_unicos = len(set(row['Módulo'] for row in edited_data if row['Módulo']))
+            modulos_unicos = edited_data.loc[edited_data['Módulo'] != '', 'Módulo'].nunique()
             st.metric("📋 Módulos únicos", modulos_unicos)
         
         # Vista previa de cambios
-        if len(edited_data) != len(questions):
-            st.info(f"ℹ️ Has modificado el número de preguntas: {len(questions)} → {len(edited_data)}")
+        if len(edited_data) != len(questionnaire):
+            st.info(f"ℹ️ Has modificado el número de preguntas: {len(questionnaire)} → {len(edited_data)}")
     
     except Exception as e:
         st.error(f"❌ Error al cargar el editor: {str(e)}")
@@ -819,31 +1352,12 @@ def step_edit_questionnaire():
     
     st.markdown('</div>', unsafe_allow_html=True)
 
-def save_questionnaire_changes(edited_data, original_data):
+def save_questionnaire_changes(edited_data, questionnaire):
     """Guarda los cambios del editor en el session state"""
     try:
-        # Convertir datos editados de vuelta al formato original
-        new_questions = []
-        for row in edited_data:
-            question = {
-                'No. Pregunta': row['ID'],
-                'KPI base o Modulo': row['Módulo'],
-                'Pregunta': row['Pregunta'],
-                'Tipo de respuesta': row['Tipo'],
-                'Opciones de respuesta': row['Opciones'].replace(' | ', '\r\n'),
-                'Indicador': row['Indicador'],
-                'Lógica de programación': row['Lógica']
-            }
-            new_questions.append(question)
-        
-        # Actualizar metadata
-        updated_data = original_data.copy()
-        updated_data['questions'] = new_questions
-        if 'metadata' in updated_data:
-            updated_data['metadata']['totalQuestions'] = len(new_questions)
-        
-        # Guardar en session state
-        st.session_state.json_response = json.dumps(updated_data)
+        edited = questionnaire.with_editor_frame(edited_data)
+        update_questionnaire(edited)
+        save_run_stage(STAGE_EDIT, {"json_response": json.dumps(edited.to_make(), ensure_ascii=False)})
         
     except Exception as e:
         st.error(f"❌ Error al guardar cambios: {str(e)}")
@@ -855,39 +1369,47 @@ def step_download_excel():
     
     if st.session_state.json_response:
         try:
-            converter = ExcelConverter()
-            excel_data = converter.json_to_excel(st.session_state.json_response)
+            # Formato de exportación
+            formats = available_formats()
+            export_format = st.selectbox(
+                "Formato de descarga",
+                formats,
+                format_func=lambda name: get_exporter(name).label
+            )
+            exporter = get_exporter(export_format)
+            
+            # El archivo solo se regenera cuando cambia la versión del cuestionario
+            export_data = questionnaire_derived(f'export_{export_format}', exporter.to_bytes)
             
             # Información del archivo
-            # Usar el método de limpieza del converter
-            converter = ExcelConverter()
-            data = converter.load_json_from_content(st.session_state.json_response)
-            metadata = data.get('metadata', {})
-            questions = data.get('questions', [])
+            questionnaire = get_questionnaire()
+            metadata = questionnaire.metadata or {}
+            ids = questionnaire.columns['id']
+            texts = questionnaire.columns['texto']
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("📋 Total preguntas", len(questions))
+                st.metric("📋 Total preguntas", len(questionnaire))
             with col2:
                 st.metric("📁 Archivo", metadata.get('fileName', 'cuestionario'))
             with col3:
-                st.metric("📊 Formato", "Excel (.xlsx)")
+                st.metric("📊 Formato", exporter.label)
             
             # Mostrar preview de las primeras preguntas
             with st.expander("👀 Vista previa de preguntas generadas"):
-                if len(questions) > 0:
-                    st.write(f"**Mostrando 3 de {len(questions)} preguntas:**")
-                    for i, q in enumerate(questions[:3], 1):
-                        st.write(f"**{q.get('No. Pregunta', f'P{i}')}:** {q.get('Pregunta', 'Sin texto')[:100]}...")
+                if len(questionnaire) > 0:
+                    st.write(f"**Mostrando 3 de {len(questionnaire)} preguntas:**")
+                    for i, (question_id, text) in enumerate(zip(ids[:3], texts[:3]), 1):
+                        st.write(f"**{question_id or f'P{i}'}:** {(text or 'Sin texto')[:100]}...")
                 
             # Botón de descarga
-            filename = f"cuestionario_{metadata.get('fileName', 'generated')}_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
+            filename = f"cuestionario_{metadata.get('fileName', 'generated')}_{datetime.now().strftime('%Y%m%d_%H%M')}.{exporter.extension}"
             
             st.download_button(
-                label="📥 Descargar Cuestionario Excel",
-                data=excel_data,
+                label=f"📥 Descargar Cuestionario {exporter.label}",
+                data=export_data,
                 file_name=filename,
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                mime=exporter.mime,
                 type="primary",
                 use_container_width=True
             )
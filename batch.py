@@ -0,0 +1,291 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from utils.document_processor import DocumentProcessor
+from utils.ai_service import AIService
+from utils.webhook_handler import WebhookHandler, DEFAULT_WEBHOOK_URL
+from utils.excel_converter import ExcelConverter
+from utils.extraction_cache import ExtractionCache
+from utils.embedding_cache import EmbeddingCache
+from utils.response_cache import ResponseCache
+from utils.text_compactor import TextCompactor
+from utils.clients import ClientRegistry, DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT
+from utils.rate_limiter import RateLimiter
+from utils.questionnaire import Questionnaire
+from utils.exporters import EXPORTERS, available_formats, export_to_file, get_exporter
+
+MIME_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".pdf": "application/pdf",
+    ".txt": "text/plain",
+}
+
+# Sufijos que identifican el KO de un brief en modo carpeta
+KO_SUFFIXES = ("_ko", "-ko")
+
+CHECKPOINT_FILE = "checkpoint.jsonl"
+
+
+class LocalFile(io.BytesIO):
+    """Archivo local con la misma interfaz que un UploadedFile de Streamlit"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = os.path.basename(path)
+        self.type = MIME_TYPES[os.path.splitext(path)[1].lower()]
+
+
+def items_from_directory(directory):
+    """Agrupa los archivos de una carpeta en trabajos brief/KO
+
+    Dos archivos con el mismo nombre y rol (p. ej. brief.pdf y brief.docx)
+    son ambiguos: se rechazan con ValueError en lugar de quedarse con uno.
+    """
+    groups = {}
+    duplicates = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in MIME_TYPES:
+            continue
+        role = "brief"
+        for suffix in KO_SUFFIXES:
+            if stem.lower().endswith(suffix):
+                stem, role = stem[:-len(suffix)], "ko"
+                break
+        group = groups.setdefault(stem, {"id": stem})
+        if role in group:
+            duplicates.append(f"{os.path.basename(group[role])} y {name}")
+            continue
+        group[role] = os.path.join(directory, name)
+    if duplicates:
+        raise ValueError(f"archivos con el mismo nombre en {directory}: {'; '.join(duplicates)}")
+    return list(groups.values())
+
+
+def items_from_manifest(path):
+    """Lee trabajos de un manifiesto CSV o JSON Lines con columnas id, brief, ko"""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, "r", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+
+    items = []
+    for row in rows:
+        item = {"id": row["id"]}
+        for role in ("brief", "ko"):
+            if row.get(role):
+                item[role] = os.path.join(base, row[role])
+        items.append(item)
+    return items
+
+
+def load_checkpoint(path):
+    """Devuelve los ids ya completados con éxito en una ejecución anterior"""
+    done = set()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get("status") == "ok":
+                        done.add(record["id"])
+    return done
+
+
+def rate_limits_from_env(environ=os.environ):
+    """Límites RATE_<ENDPOINT>_RPM/TPM/CONCURRENCY del entorno (como get_rate_limiter en app.py)"""
+    limits = {}
+    for endpoint in ("chat", "embeddings", "make"):
+        prefix = f"RATE_{endpoint.upper()}"
+        if environ.get(f"{prefix}_RPM"):
+            limits[endpoint] = (
+                int(environ[f"{prefix}_RPM"]),
+                int(environ.get(f"{prefix}_TPM") or 0) or None,
+                int(environ.get(f"{prefix}_CONCURRENCY") or 4)
+            )
+    return limits
+
+
+def client_registry_from_env(environ=os.environ):
+    """ClientRegistry con OPENAI_API_KEY y HTTP_* del entorno (como get_client_registry en app.py)"""
+    return ClientRegistry(
+        openai_api_key=environ.get("OPENAI_API_KEY", ""),
+        pool_size=int(environ.get("HTTP_POOL_SIZE") or DEFAULT_POOL_SIZE),
+        connect_timeout=float(environ.get("HTTP_CONNECT_TIMEOUT") or DEFAULT_CONNECT_TIMEOUT),
+        read_timeout=float(environ.get("HTTP_READ_TIMEOUT") or DEFAULT_READ_TIMEOUT)
+    )
+
+
+class BatchPipeline:
+    """Ejecuta el flujo completo brief → Excel sobre muchos trabajos"""
+
+    def __init__(self, output_dir, formats, extract_workers, ai_workers, make_workers, export_workers):
+        self.output_dir = output_dir
+        self.formats = formats
+
+        # Misma configuración que la app, leída del entorno en lugar de st.secrets
+        registry = client_registry_from_env()
+        rate_limiter = RateLimiter(rate_limits_from_env())
+        self.processor = DocumentProcessor(
+            cache=ExtractionCache(),
+            pdf_workers=int(os.environ.get("PDF_WORKERS") or 0) or None
+        )
+        self.ai_service = AIService(
+            embedding_cache=EmbeddingCache(),
+            response_cache=ResponseCache(),
+            client=registry.openai_client(),
+            rate_limiter=rate_limiter
+        )
+        self.webhook_handler = WebhookHandler(
+            session=registry.http_session(),
+            timeout=registry.timeout,
+            webhook_url=os.environ.get("WEBHOOK_URL", DEFAULT_WEBHOOK_URL),
+            embedding_encoding=os.environ.get("MAKE_EMBEDDING_ENCODING") or None,
+            compress=os.environ.get("MAKE_GZIP", "").strip().lower() in ("1", "true", "yes"),
+            rate_limiter=rate_limiter
+        )
+        self.converter = ExcelConverter()
+        self.compactor = TextCompactor()
+
+        # Concurrencia máxima de cada etapa
+        self.limits = {
+            "extract": threading.Semaphore(extract_workers),
+            "ai": threading.Semaphore(ai_workers),
+            "make": threading.Semaphore(make_workers),
+            "export": threading.Semaphore(export_workers),
+        }
+        self.max_in_flight = extract_workers + ai_workers + make_workers + export_workers
+
+        self._checkpoint_lock = threading.Lock()
+        self.checkpoint_path = os.path.join(output_dir, CHECKPOINT_FILE)
+
+    def _stage(self, name, timings, func, *args):
+        """Ejecuta una etapa respetando su límite de concurrencia y mide su duración"""
+        with self.limits[name]:
+            start = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                timings[name] = round(time.perf_counter() - start, 3)
+
+    def _extract(self, item):
+        documents = [self.processor.extract_text(LocalFile(item[role])) for role in ("brief", "ko") if item.get(role)]
+        compacted, _ = self.compactor.compact(documents)
+        return "\n".join(compacted)
+
+    def _analyze(self, full_text):
+        # raise_errors: sin interfaz, el error real de OpenAI va al checkpoint
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            metadata_future = executor.submit(self.ai_service.extract_metadata, full_text, raise_errors=True)
+            embedding_future = executor.submit(self.ai_service.generate_embedding, full_text, raise_errors=True)
+            metadata, embedding = metadata_future.result(), embedding_future.result()
+        if not metadata:
+            raise ValueError("el modelo no devolvió metadatos")
+        return metadata, embedding
+
+    def _generate(self, item_id, metadata, embedding):
+        success, response = self.webhook_handler.send_to_make(embedding, metadata, f"batch_{item_id}")
+        if not success:
+            raise ValueError(response)
+        if isinstance(response, dict):
+            return Questionnaire.from_make(response)
+        return Questionnaire.from_make(self.converter.load_json_from_content(response))
+
+    def _export(self, item_id, questionnaire):
+        paths = []
+        for fmt in self.formats:
+            path = os.path.join(self.output_dir, f"{item_id}.{get_exporter(fmt).extension}")
+            export_to_file(questionnaire, fmt, path)
+            paths.append(path)
+        return paths
+
+    def run_item(self, item):
+        """Procesa un trabajo y devuelve su registro de resultado"""
+        timings = {}
+        record = {"id": item["id"], "timings": timings}
+        try:
+            full_text = self._stage("extract", timings, self._extract, item)
+            metadata, embedding = self._stage("ai", timings, self._analyze, full_text)
+            questionnaire = self._stage("make", timings, self._generate, item["id"], metadata, embedding)
+            record["outputs"] = self._stage("export", timings, self._export, item["id"], questionnaire)
+            record["questions"] = len(questionnaire)
+            record["status"] = "ok"
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+
+        with self._checkpoint_lock:
+            with open(self.checkpoint_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return record
+
+    def run(self, items, resume=True):
+        """Procesa todos los trabajos pendientes y devuelve sus registros"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        done = load_checkpoint(self.checkpoint_path) if resume else set()
+        pending = [item for item in items if item["id"] not in done]
+        print(f"{len(pending)} trabajos pendientes ({len(done)} ya completados)", file=sys.stderr)
+
+        results = []
+        with ThreadPoolExecutor(max_workers=max(self.max_in_flight, 1)) as executor:
+            futures = [executor.submit(self.run_item, item) for item in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                results.append(record)
+                detail = record.get("error") or ", ".join(f"{k}={v}s" for k, v in record["timings"].items())
+                print(f"[{record['status']}] {record['id']}: {detail}", file=sys.stderr)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Procesa briefs en lote de principio a fin (brief → cuestionario)")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--input-dir", help="Carpeta con briefs (los KO terminan en _ko o -ko)")
+    source.add_argument("--manifest", help="Manifiesto CSV o JSON Lines con columnas id, brief, ko")
+    parser.add_argument("--output-dir", required=True, help="Carpeta de salida y checkpoint")
+    parser.add_argument("--formats", default="xlsx", help="Formatos de exportación separados por comas")
+    parser.add_argument("--extract-workers", type=int, default=4)
+    parser.add_argument("--ai-workers", type=int, default=4)
+    parser.add_argument("--make-workers", type=int, default=2)
+    parser.add_argument("--export-workers", type=int, default=2)
+    parser.add_argument("--no-resume", action="store_true", help="Ignorar el checkpoint y reprocesar todo")
+    args = parser.parse_args(argv)
+
+    try:
+        items = items_from_directory(args.input_dir) if args.input_dir else items_from_manifest(args.manifest)
+    except ValueError as e:
+        parser.error(str(e))
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    # Validar antes de pagar extracción, OpenAI y Make por cada trabajo
+    for fmt in formats:
+        if fmt not in EXPORTERS:
+            parser.error(f"formato no soportado: {fmt} (opciones: {', '.join(EXPORTERS)})")
+        if fmt not in available_formats():
+            parser.error(f"el formato {fmt} no está disponible: faltan sus dependencias (p. ej. pyarrow)")
+
+    pipeline = BatchPipeline(
+        args.output_dir,
+        formats,
+        args.extract_workers,
+        args.ai_workers,
+        args.make_workers,
+        args.export_workers
+    )
+    results = pipeline.run(items, resume=not args.no_resume)
+
+    failed = [record for record in results if record["status"] != "ok"]
+    print(f"{len(results) - len(failed)} completados, {len(failed)} con error", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
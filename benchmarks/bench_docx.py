@@ -0,0 +1,73 @@
+"""Compara la extracción de DOCX con python-docx (ruta anterior) y con iter_docx_text
+
+Uso: python benchmarks/bench_docx.py [--paragraphs N] [--rows N] [--repeat N]
+Requiere python-docx solo para generar el documento y medir la ruta anterior.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import docx
+from utils.document_processor import iter_docx_text
+
+
+def build_docx(paragraphs, rows):
+    """Documento sintético con párrafos y una tabla de cuotas"""
+    document = docx.Document()
+    for i in range(paragraphs):
+        document.add_paragraph(f"Párrafo {i}: objetivo del estudio, target y decisiones a tomar. " * 3)
+    table = document.add_table(rows=rows, cols=3)
+    for i, row in enumerate(table.rows):
+        for j, cell in enumerate(row.cells):
+            cell.text = f"celda {i}-{j}"
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+def previous_path(data):
+    """Extracción anterior: modelo completo de python-docx, solo párrafos"""
+    document = docx.Document(io.BytesIO(data))
+    return "\n".join(paragraph.text for paragraph in document.paragraphs)
+
+
+def current_path(data):
+    """Extracción actual: streaming de word/document.xml (párrafos y tablas)"""
+    return "\n".join(iter_docx_text(io.BytesIO(data)))
+
+
+def measure(func, data, repeat):
+    """Mejor tiempo de repeat ejecuciones y pico de memoria de Python (tracemalloc, sin memoria nativa)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = func(data)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--paragraphs", type=int, default=5000)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = build_docx(args.paragraphs, args.rows)
+    print(f"DOCX: {args.paragraphs} párrafos, tabla de {args.rows} filas, {len(data) / 1024:.0f} KB")
+    for name, func in (("python-docx (anterior)", previous_path), ("iter_docx_text (actual)", current_path)):
+        seconds, peak, chars = measure(func, data, args.repeat)
+        print(f"{name:26} {seconds * 1000:8.1f} ms  pico {peak / 2**20:7.1f} MB  {chars} caracteres")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Compara la exportación a Excel de la ruta anterior (pandas + openpyxl normal) con la actual
+
+Uso: python benchmarks/bench_excel_export.py [--rows N] [--repeat N]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+from utils.excel_converter import ExcelConverter
+from utils.questionnaire import Questionnaire
+
+
+def build_response(rows):
+    """Respuesta de Make sintética con rows preguntas"""
+    return json.dumps({"questions": [
+        {
+            "No. Pregunta": f"P{i}",
+            "KPI base o Modulo": f"Módulo {i % 12}",
+            "Pregunta": f"¿Qué tan probable es que recomiende la marca {i}? " * 2,
+            "Tipo de respuesta": "Escala",
+            "Opciones de respuesta": "1\r\n2\r\n3\r\n4\r\n5",
+            "Indicador": "NPS",
+            "Lógica de programación": "Mostrar si P1 = 1",
+        }
+        for i in range(rows)
+    ]}, ensure_ascii=False)
+
+
+def previous_path(content):
+    """Exportación anterior: lista de dicts, DataFrame, ExcelWriter y anchos celda a celda"""
+    questions = json.loads(content)["questions"]
+    df = pd.DataFrame([{
+        "modulo": q.get("KPI base o Modulo", ""),
+        "id": q.get("No. Pregunta", ""),
+        "texto": q.get("Pregunta", ""),
+        "tipo": q.get("Tipo de respuesta", ""),
+        "opciones": q.get("Opciones de respuesta", "").replace("\r\n", ", ").strip(),
+        "indicador": q.get("Indicador", ""),
+        "logica": q.get("Lógica de programación", ""),
+    } for q in questions])
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine="openpyxl") as writer:
+        df.to_excel(writer, sheet_name="Preguntas", index=False)
+        worksheet = writer.sheets["Preguntas"]
+        for column in worksheet.columns:
+            max_length = max(len(str(cell.value)) for cell in column)
+            worksheet.column_dimensions[column[0].column_letter].width = min(max_length + 2, 50)
+    return output.getvalue()
+
+
+def current_path(content):
+    """Exportación actual: Questionnaire columnar y openpyxl en modo write-only"""
+    converter = ExcelConverter()
+    questionnaire = Questionnaire.from_make(converter.load_json_from_content(content))
+    return converter.questionnaire_to_excel(questionnaire)
+
+
+def measure(func, content, repeat):
+    """Mejor tiempo de repeat ejecuciones y pico de memoria de Python (tracemalloc, sin memoria nativa)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(content)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    content = build_response(args.rows)
+    print(f"Cuestionario: {args.rows} preguntas, JSON de {len(content) / 2**20:.1f} MB")
+    for name, func in (("ExcelWriter (anterior)", previous_path), ("write-only (actual)", current_path)):
+        seconds, peak, size = measure(func, content, args.repeat)
+        print(f"{name:24} {seconds * 1000:8.1f} ms  pico {peak / 2**20:7.1f} MB  xlsx {size / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
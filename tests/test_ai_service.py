@@ -0,0 +1,133 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("openai")
+pytest.importorskip("streamlit")
+
+from types import SimpleNamespace
+
+from utils import ai_service
+from utils.ai_service import AIService, chunk_text_by_tokens, count_tokens, merge_partial_metadata
+from utils.rate_limiter import RateLimiter
+from utils.response_cache import ResponseCache
+
+
+def test_text_fields_take_the_majority_value():
+    partials = [{"marca": "Acme"}, {"marca": "Otra"}, {"marca": " acme "}]
+    assert merge_partial_metadata(partials)["marca"] == "Acme"
+
+
+def test_ties_go_to_the_earliest_section():
+    assert merge_partial_metadata([{"target": "A"}, {"target": "B"}])["target"] == "A"
+
+
+def test_empty_values_do_not_vote():
+    assert merge_partial_metadata([{"industria": ""}, {"industria": "Retail"}])["industria"] == "Retail"
+    assert merge_partial_metadata([{"industria": None}])["industria"] == ""
+
+
+def test_lists_are_unioned_without_duplicates():
+    partials = [{"preguntas_negocio": ["¿Qué?", "¿Cómo?"]}, {"preguntas_negocio": ["¿qué? ", "¿Cuándo?"]}]
+    assert merge_partial_metadata(partials)["preguntas_negocio"] == ["¿Qué?", "¿Cómo?", "¿Cuándo?"]
+
+
+def test_booleans_are_true_if_any_section_says_so():
+    assert merge_partial_metadata([{"tiene_kickoff": False}, {"tiene_kickoff": True}])["tiene_kickoff"] is True
+
+
+def test_key_order_follows_first_appearance():
+    assert list(merge_partial_metadata([{"a": "1"}, {"b": "2", "a": "1"}])) == ["a", "b"]
+
+
+class SectionClient:
+    """Cliente falso: responde por sección y falla en la sección indicada"""
+
+    def __init__(self, fail_section=None):
+        self.fail_section = fail_section
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, messages, **kwargs):
+        content = messages[1]["content"]
+        if self.fail_section is not None and f"sección {self.fail_section} " in content.lower():
+            raise RuntimeError("límite de contexto excedido")
+        message = SimpleNamespace(content='{"marca": "Acme"}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def small_sections(monkeypatch):
+    monkeypatch.setattr(ai_service, "tiktoken", None)
+    monkeypatch.setattr(ai_service, "METADATA_MAX_INPUT_TOKENS", 50)
+    monkeypatch.setattr(ai_service, "METADATA_SECTION_TOKENS", 40)
+    monkeypatch.setattr(ai_service, "METADATA_SECTION_OVERLAP", 0)
+    return "x" * 1000
+
+
+def test_section_error_propagates_and_is_not_cached(small_sections, tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "responses.sqlite3"))
+    service = AIService(client=SectionClient(fail_section=2), response_cache=cache)
+
+    with pytest.raises(RuntimeError, match="límite de contexto"):
+        service.extract_metadata(small_sections, raise_errors=True)
+
+    key = cache.make_key(ai_service.METADATA_MODEL, ai_service.METADATA_PROMPT_VERSION, small_sections)
+    assert cache.get(key) is None
+
+
+def test_complete_map_reduce_result_is_cached(small_sections, tmp_path):
+    cache = ResponseCache(db_path=str(tmp_path / "responses.sqlite3"))
+    service = AIService(client=SectionClient(), response_cache=cache)
+
+    assert service.extract_metadata(small_sections, raise_errors=True) == {"marca": "Acme"}
+    key = cache.make_key(ai_service.METADATA_MODEL, ai_service.METADATA_PROMPT_VERSION, small_sections)
+    assert cache.get(key) == {"marca": "Acme"}
+
+
+class RecordingLimiter(RateLimiter):
+    """Limitador que registra los tokens pedidos sin esperar a la cubeta"""
+
+    def __init__(self, limits):
+        super().__init__(limits)
+        self.requested = []
+
+    def call(self, endpoint, func, *args, tokens=0, consume=None, **kwargs):
+        self.requested.append(tokens)
+        assert tokens <= self.token_capacity(endpoint)
+        response = func(*args, **kwargs)
+        return consume(response) if consume is not None else response
+
+
+def test_sections_fit_a_chat_limit_below_the_default_sizes(monkeypatch):
+    monkeypatch.setattr(ai_service, "tiktoken", None)
+    limiter = RecordingLimiter({"chat": (500, 30000, 8)})
+    service = AIService(client=SectionClient(), rate_limiter=limiter)
+
+    brief = "x" * (40000 * 4)
+    assert service.extract_metadata(brief, raise_errors=True) == {"marca": "Acme"}
+    assert len(limiter.requested) > 1
+    assert max(limiter.requested) <= 30000
+
+
+def test_chat_limit_too_small_for_the_prompt_is_reported(monkeypatch):
+    monkeypatch.setattr(ai_service, "tiktoken", None)
+    service = AIService(client=SectionClient(), rate_limiter=RateLimiter({"chat": (500, 1000, 8)}))
+    with pytest.raises(ValueError, match="tokens por minuto"):
+        service.extract_metadata("brief", raise_errors=True)
+
+
+def test_token_counting_falls_back_when_the_encoding_cannot_load(monkeypatch):
+    calls = []
+
+    def get_encoding(name):
+        calls.append(name)
+        raise OSError("sin conexión para descargar la codificación")
+
+    monkeypatch.setattr(ai_service, "tiktoken", SimpleNamespace(get_encoding=get_encoding))
+    ai_service._load_encoding.cache_clear()
+    try:
+        assert count_tokens("a" * 10) == 3
+        assert chunk_text_by_tokens("a" * 10, max_tokens=2, overlap=0)[0] == ("a" * 8, 2)
+        assert count_tokens("otra vez") == 2
+        assert calls == ["cl100k_base"]
+    finally:
+        ai_service._load_encoding.cache_clear()
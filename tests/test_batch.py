@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("openai")
+pytest.importorskip("streamlit")
+
+from batch import client_registry_from_env, items_from_directory, rate_limits_from_env
+
+
+def touch(directory, *names):
+    for name in names:
+        (directory / name).write_bytes(b"")
+
+
+def test_directory_pairs_briefs_with_their_ko(tmp_path):
+    touch(tmp_path, "acme.docx", "acme_ko.pdf", "otro.txt", "notas.md")
+    items = items_from_directory(str(tmp_path))
+    assert [item["id"] for item in items] == ["acme", "otro"]
+    assert items[0]["ko"].endswith("acme_ko.pdf")
+    assert "ko" not in items[1]
+
+
+def test_duplicate_stems_are_reported(tmp_path):
+    touch(tmp_path, "brief.docx", "brief.pdf", "acme-ko.pdf", "acme_ko.docx")
+    with pytest.raises(ValueError) as excinfo:
+        items_from_directory(str(tmp_path))
+    assert "brief.docx y brief.pdf" in str(excinfo.value)
+    assert "acme-ko.pdf y acme_ko.docx" in str(excinfo.value)
+
+
+def test_settings_come_from_the_environment():
+    environ = {
+        "RATE_CHAT_RPM": "100",
+        "RATE_CHAT_TPM": "30000",
+        "RATE_MAKE_RPM": "10",
+        "HTTP_POOL_SIZE": "5",
+        "HTTP_READ_TIMEOUT": "60",
+    }
+    assert rate_limits_from_env(environ) == {"chat": (100, 30000, 4), "make": (10, None, 4)}
+
+    registry = client_registry_from_env(environ)
+    assert registry.pool_size == 5
+    assert registry.read_timeout == 60.0
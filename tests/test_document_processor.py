@@ -0,0 +1,82 @@
+import io
+
+import pytest
+
+pytest.importorskip("PyPDF2")
+docx = pytest.importorskip("docx")
+
+from utils import document_processor
+from utils.document_processor import iter_docx_text
+
+
+def save(document):
+    output = io.BytesIO()
+    document.save(output)
+    output.seek(0)
+    return output
+
+
+def test_paragraphs_and_tables_in_document_order():
+    document = docx.Document()
+    document.add_paragraph("Antes")
+    table = document.add_table(rows=2, cols=2)
+    for i, row in enumerate(table.rows):
+        for j, cell in enumerate(row.cells):
+            cell.text = f"{i}-{j}"
+    document.add_paragraph("Después")
+    assert list(iter_docx_text(save(document))) == ["Antes", "0-0 | 0-1", "1-0 | 1-1", "Después"]
+
+
+def test_empty_and_vertically_merged_rows_are_skipped():
+    document = docx.Document()
+    table = document.add_table(rows=4, cols=2)
+    table.cell(0, 0).merge(table.cell(1, 0)).text = "combinada"
+    table.cell(0, 1).text = "b"
+    table.cell(3, 1).text = "d"
+    assert list(iter_docx_text(save(document))) == ["combinada | b", " | d"]
+
+
+def test_horizontally_merged_cells_are_one_cell():
+    document = docx.Document()
+    table = document.add_table(rows=1, cols=3)
+    table.cell(0, 0).merge(table.cell(0, 1)).text = "ancha"
+    table.cell(0, 2).text = "c"
+    assert list(iter_docx_text(save(document))) == ["ancha | c"]
+
+
+def test_nested_table_rows_stay_inside_their_cell():
+    document = docx.Document()
+    outer = document.add_table(rows=1, cols=2)
+    outer.cell(0, 0).text = "fuera"
+    inner = outer.cell(0, 1).add_table(rows=2, cols=2)
+    inner.cell(0, 0).text = "x"
+    inner.cell(0, 1).text = "y"
+    document.add_paragraph("fin")
+
+    # La celda contiene su párrafo inicial (vacío) y las filas no vacías de la tabla anidada
+    assert list(iter_docx_text(save(document))) == ["fuera | x | y", "fin"]
+
+
+def test_body_is_cleared_while_streaming(monkeypatch):
+    document = docx.Document()
+    for i in range(1000):
+        document.add_paragraph(f"Párrafo {i}")
+        table = document.add_table(rows=1, cols=1)
+        table.cell(0, 0).text = f"Celda {i}"
+
+    bodies = []
+    iterparse = document_processor.ET.iterparse
+
+    def recording_iterparse(source, events=None):
+        for event, elem in iterparse(source, events=events):
+            if event == "start" and elem.tag == document_processor._W + "body":
+                bodies.append(elem)
+            yield event, elem
+
+    monkeypatch.setattr(document_processor.ET, "iterparse", recording_iterparse)
+
+    sizes = [len(bodies[0]) for _ in iter_docx_text(save(document))]
+    assert len(sizes) == 2000
+    # Cada bloque se libera tras emitirse: el body solo retiene lo que el
+    # parser ya leyó de su búfer, nunca el documento entero
+    assert max(sizes) < 200
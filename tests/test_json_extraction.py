@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+from utils.json_extraction import (
+    IncrementalFieldParser,
+    JSONExtractionError,
+    extract_json,
+    find_json_span,
+)
+
+
+def test_plain_object():
+    assert extract_json('{"a": 1, "b": [1, 2]}') == {"a": 1, "b": [1, 2]}
+
+
+def test_fenced_block_is_preferred():
+    text = 'Antes {"no": 0} ```json\n{"si": 1}\n```'
+    assert extract_json(text) == {"si": 1}
+
+
+def test_skips_bracketed_prose_before_json():
+    text = 'Aquí tienes [nota]: {"a":1}'
+    start, end = find_json_span(text)
+    assert text[start:end] == '{"a":1}'
+    assert extract_json(text) == {"a": 1}
+
+
+def test_braces_inside_strings_are_ignored():
+    assert extract_json('texto {"x": "} ]"} fin') == {"x": "} ]"}
+
+
+def test_top_level_array():
+    assert extract_json("Resultado: [1, 2, 3].") == [1, 2, 3]
+
+
+@pytest.mark.parametrize("text", ["sin json", '{"a": 1', "[nota] sin cierre {"])
+def test_invalid_input_raises(text):
+    with pytest.raises(JSONExtractionError):
+        extract_json(text)
+
+
+@pytest.mark.parametrize("text", [
+    '{"a": {"b": 1}, }',
+    'Cuestionario: {"questions": [{"id": "P1", "text": "Edad"}, {"id": "P2", "text": "Sexo"},]}',
+])
+def test_malformed_outer_object_raises_instead_of_returning_inner(text):
+    with pytest.raises(JSONExtractionError):
+        extract_json(text)
+
+
+@pytest.mark.parametrize("text", ["[" * 20000 + "x", '{"a":[' * 3000])
+def test_unclosed_nesting_is_linear(text):
+    started = time.perf_counter()
+    with pytest.raises(JSONExtractionError):
+        extract_json(text)
+    assert time.perf_counter() - started < 1.0
+
+
+def test_extraction_error_is_value_error():
+    assert issubclass(JSONExtractionError, ValueError)
+
+
+def feed_all(parser, chunks):
+    fields = []
+    for chunk in chunks:
+        fields.extend(parser.feed(chunk))
+    return fields
+
+
+def test_incremental_parser_emits_fields_as_they_close():
+    parser = IncrementalFieldParser()
+    assert parser.feed('{"marca": "Acme", "lista"') == [("marca", "Acme")]
+    assert parser.feed(': [1, {"x": ","}], "ok": true}') == [("lista", [1, {"x": ","}]), ("ok", True)]
+
+
+def test_incremental_parser_handles_split_strings_and_escapes():
+    chunks = ['```json\n{"a": "co', 'mi\\"lla, }', '", "b": 2', '}\n```']
+    assert feed_all(IncrementalFieldParser(), chunks) == [("a", 'comi"lla, }'), ("b", 2)]
+
+
+def test_incremental_parser_ignores_text_after_object():
+    parser = IncrementalFieldParser()
+    assert feed_all(parser, ['{"a": 1}', ', "b": 2}']) == [("a", 1)]
+
+
+def test_incremental_parser_ignores_stray_closer_before_object():
+    assert feed_all(IncrementalFieldParser(), ['} ruido {"a": 1}']) == [("a", 1)]
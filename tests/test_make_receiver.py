@@ -0,0 +1,95 @@
+import gzip
+import http.client
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from utils.make_receiver import (
+    STATUS_DONE,
+    STATUS_ERROR,
+    STATUS_PENDING,
+    CallbackReceiver,
+    ResultStore,
+)
+
+
+def test_store_tracks_pending_and_results():
+    store = ResultStore()
+    token = store.mark_pending("job")
+    assert store.get("job") == (STATUS_PENDING, None)
+    assert store.accepts_callback("job", token)
+    assert not store.accepts_callback("job", "otro")
+    assert not store.accepts_callback("job", None)
+
+    store.set_result("job", False, "fallo")
+    assert store.get("job") == (STATUS_ERROR, "fallo")
+    assert not store.accepts_callback("job", token)
+    assert store.get("desconocido") is None
+
+
+def test_store_wait_wakes_up_on_result():
+    store = ResultStore()
+    store.mark_pending("job")
+    threading.Timer(0.05, store.set_result, args=("job", True, {"ok": 1})).start()
+    assert store.wait("job", timeout=5) == (STATUS_DONE, {"ok": 1})
+    assert store.wait("desconocido", timeout=0.01) is None
+
+
+def test_store_purges_old_entries_and_discards():
+    store = ResultStore(max_age=-1)
+    store.mark_pending("viejo")
+    store.mark_pending("nuevo")
+    assert store.get("viejo") is None
+
+    store.discard("nuevo")
+    assert store.get("nuevo") is None
+
+
+@pytest.fixture
+def receiver():
+    store = ResultStore()
+    receiver = CallbackReceiver(store, port=0, max_body_bytes=1024)
+    receiver.start()
+    yield receiver
+    receiver.stop()
+
+
+def post(receiver, path, body=b"", headers=None):
+    connection = http.client.HTTPConnection(receiver.host, receiver.port, timeout=5)
+    try:
+        connection.request("POST", path, body=body, headers=headers or {})
+        return connection.getresponse().status
+    except (BrokenPipeError, ConnectionResetError):
+        # El receptor puede cerrar antes de que termine el envío del cuerpo
+        return None
+    finally:
+        connection.close()
+
+
+def test_receiver_stores_gzip_json_for_pending_job(receiver):
+    token = receiver.result_store.mark_pending("job")
+    body = gzip.compress(json.dumps({"preguntas": [1, 2]}).encode("utf-8"))
+    status = post(receiver, f"/make/job?token={token}", body, {"Content-Encoding": "gzip"})
+    assert status == 200
+    assert receiver.result_store.get("job") == (STATUS_DONE, {"preguntas": [1, 2]})
+
+
+def test_receiver_rejects_wrong_token_before_reading_body(receiver):
+    receiver.result_store.mark_pending("job")
+    assert post(receiver, "/make/job?token=falso", b"x" * 10, {"Content-Length": str(10 ** 9)}) in (403, None)
+    assert receiver.result_store.get("job") == (STATUS_PENDING, None)
+    assert post(receiver, "/otra/ruta", b"{}") == 404
+
+
+def test_receiver_caps_raw_and_decompressed_size(receiver):
+    token = receiver.result_store.mark_pending("job")
+    assert post(receiver, f"/make/job?token={token}", b"x" * 2048) in (413, None)
+
+    bomb = gzip.compress(b" " * (256 * 1024))
+    assert len(bomb) < 1024
+    status = post(receiver, f"/make/job?token={token}", bomb, {"Content-Encoding": "gzip"})
+    assert status == 413
+    assert receiver.result_store.get("job") == (STATUS_PENDING, None)
@@ -0,0 +1,109 @@
+import io
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+
+from utils.exporters import get_exporter
+from utils.questionnaire import Questionnaire
+
+MAKE_DATA = {
+    "questions": [
+        {
+            "No. Pregunta": "P1",
+            "KPI base o Modulo": "Filtros",
+            "Pregunta": "¿Qué edad tienes?",
+            "Tipo de respuesta": "Única",
+            "Opciones de respuesta": "18-24\r\n25-34\r\n35+",
+            "Indicador": "Edad",
+            "Lógica de programación": "",
+        },
+        {
+            "No. Pregunta": "",
+            "KPI base o Modulo": "Marca",
+            "Pregunta": "¿Qué marcas conoces?",
+            "Tipo de respuesta": "Múltiple",
+            "Opciones de respuesta": "Acme\r\nOtra",
+            "Indicador": "Awareness",
+            "Lógica de programación": "Si P1 = 18-24",
+        },
+    ],
+    "metadata": {"marca": "Acme", "totalQuestions": 2},
+    "version": 3,
+}
+
+
+def test_make_round_trip_without_edits_keeps_the_json():
+    questionnaire = Questionnaire.from_make(MAKE_DATA)
+    assert len(questionnaire) == 2
+    assert questionnaire.to_make() == MAKE_DATA
+
+
+def test_editor_frame_uses_editor_separator_and_fills_missing_ids():
+    frame = Questionnaire.from_make(MAKE_DATA).to_editor_frame()
+    assert frame["ID"].tolist() == ["P1", "P2"]
+    assert frame["Opciones"].tolist() == ["18-24 | 25-34 | 35+", "Acme | Otra"]
+
+
+def test_editor_round_trip_restores_make_separator():
+    questionnaire = Questionnaire.from_make(MAKE_DATA)
+    edited = questionnaire.with_editor_frame(questionnaire.to_editor_frame()).to_make()
+
+    assert [q["Opciones de respuesta"] for q in edited["questions"]] == ["18-24\r\n25-34\r\n35+", "Acme\r\nOtra"]
+    # El ID asignado en el editor se conserva al volver a Make
+    assert [q["No. Pregunta"] for q in edited["questions"]] == ["P1", "P2"]
+    assert edited["metadata"] == {"marca": "Acme", "totalQuestions": 2}
+    assert edited["version"] == 3
+
+
+def test_rows_added_in_the_editor_with_empty_cells():
+    questionnaire = Questionnaire.from_make(MAKE_DATA)
+    frame = questionnaire.to_editor_frame()
+    new_row = {column: None for column in frame.columns}
+    new_row.update({"ID": "P3", "Pregunta": "¿Algo más?"})
+    frame = pd.concat([frame, pd.DataFrame([new_row])], ignore_index=True)
+
+    edited = questionnaire.with_editor_frame(frame)
+    make = edited.to_make()
+
+    assert len(edited) == 3
+    assert make["metadata"]["totalQuestions"] == 3
+    added = make["questions"][2]
+    assert added["Pregunta"] == "¿Algo más?"
+    assert added["Opciones de respuesta"] == ""
+    assert added["Indicador"] == ""
+    assert None not in added.values()
+
+
+def test_deleted_rows_update_total_questions():
+    questionnaire = Questionnaire.from_make(MAKE_DATA)
+    edited = questionnaire.with_editor_frame(questionnaire.to_editor_frame().iloc[:1])
+    assert edited.to_make()["metadata"]["totalQuestions"] == 1
+
+
+def test_export_frame_columns_and_options():
+    frame = Questionnaire.from_make(MAKE_DATA).to_export_frame()
+    assert frame.columns.tolist() == ["modulo", "id", "texto", "tipo", "opciones", "indicador", "logica"]
+    assert frame["opciones"].tolist() == ["18-24, 25-34, 35+", "Acme, Otra"]
+
+
+def test_export_frames_in_chunks_match_the_full_frame():
+    questions = [dict(MAKE_DATA["questions"][0], **{"No. Pregunta": f"P{i}"}) for i in range(1, 8)]
+    questionnaire = Questionnaire.from_make({"questions": questions})
+
+    chunks = list(questionnaire.iter_export_frames(3))
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    combined = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_frame_equal(combined, questionnaire.to_export_frame())
+
+
+def test_text_exporters_write_the_export_frame_of_an_edited_questionnaire():
+    questionnaire = Questionnaire.from_make(MAKE_DATA)
+    edited = questionnaire.with_editor_frame(questionnaire.to_editor_frame())
+    expected = edited.to_export_frame()
+
+    csv = pd.read_csv(io.BytesIO(get_exporter("csv").to_bytes(edited)), dtype=str, keep_default_na=False)
+    assert csv.to_dict("records") == expected.to_dict("records")
+
+    jsonl = pd.read_json(io.BytesIO(get_exporter("jsonl").to_bytes(edited)), lines=True, dtype=str)
+    assert jsonl.to_dict("records") == expected.to_dict("records")
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+from utils import rate_limiter
+from utils.rate_limiter import (
+    EndpointLimiter,
+    TokenBucket,
+    is_retryable,
+    is_retryable_unsent,
+)
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(status_code)
+        self.response = FakeResponse(status_code, headers)
+
+
+def test_bucket_allows_burst_up_to_capacity():
+    bucket = TokenBucket(600)
+    start = time.monotonic()
+    bucket.acquire(600)
+    assert time.monotonic() - start < 0.1
+
+
+def test_bucket_waits_for_refill():
+    bucket = TokenBucket(600)  # 10 tokens por segundo
+    bucket.acquire(600)
+    start = time.monotonic()
+    bucket.acquire(2)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_bucket_rejects_requests_larger_than_capacity():
+    with pytest.raises(ValueError):
+        TokenBucket(100).acquire(101)
+
+
+def test_retry_policies_by_status():
+    assert is_retryable(HTTPError(503))
+    assert not is_retryable(HTTPError(400))
+    assert is_retryable_unsent(HTTPError(429))
+    assert not is_retryable_unsent(HTTPError(502))
+
+
+def test_retry_policies_match_exception_types_not_names():
+    class ReadTimeout(Exception):
+        pass
+
+    assert not is_retryable(ReadTimeout())
+    assert is_retryable(ConnectionResetError())
+    assert is_retryable_unsent(ConnectionRefusedError())
+    assert not is_retryable_unsent(ConnectionResetError())
+
+
+def test_requests_errors():
+    requests = pytest.importorskip("requests")
+    from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+    refused = requests.exceptions.ConnectionError(
+        MaxRetryError(None, "/hook", reason=NewConnectionError(None, "Connection refused"))
+    )
+    aborted = requests.exceptions.ConnectionError(
+        ProtocolError("Connection aborted.", ConnectionResetError(104, "Connection reset by peer"))
+    )
+    read_timeout = requests.exceptions.ReadTimeout()
+
+    for exc in (refused, aborted, read_timeout, requests.exceptions.ConnectTimeout()):
+        assert is_retryable(exc)
+    assert is_retryable_unsent(refused)
+    assert is_retryable_unsent(requests.exceptions.ConnectTimeout())
+    assert not is_retryable_unsent(aborted)
+    assert not is_retryable_unsent(read_timeout)
+
+
+def test_openai_errors():
+    openai = pytest.importorskip("openai")
+    import httpx
+
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+
+    def wrapped(cause):
+        exc = openai.APIConnectionError(request=request)
+        exc.__cause__ = cause
+        return exc
+
+    not_connected = wrapped(httpx.ConnectError("Connection refused"))
+    dropped = wrapped(httpx.RemoteProtocolError("Server disconnected"))
+    assert is_retryable(not_connected) and is_retryable(dropped)
+    assert is_retryable_unsent(not_connected)
+    assert not is_retryable_unsent(dropped)
+
+
+def test_call_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise HTTPError(429, {"retry-after": "0"})
+        return "ok"
+
+    limiter = EndpointLimiter(6000)
+    assert limiter.call(flaky) == "ok"
+    assert limiter.stats() == {"calls": 1, "retries": 2, "failures": 0}
+
+
+def test_call_does_not_retry_with_unsent_policy(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    attempts = []
+
+    def slow():
+        attempts.append(1)
+        raise TimeoutError("read timed out")
+
+    limiter = EndpointLimiter(6000, retryable=is_retryable_unsent)
+    with pytest.raises(TimeoutError):
+        limiter.call(slow)
+    assert len(attempts) == 1
+
+
+def test_consume_holds_the_concurrency_slot():
+    limiter = EndpointLimiter(6000, max_concurrency=1)
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def stream():
+        with lock:
+            active.append(1)
+            peak.append(len(active))
+        try:
+            for i in range(3):
+                time.sleep(0.01)
+                yield i
+        finally:
+            with lock:
+                active.pop()
+
+    threads = [threading.Thread(target=limiter.call, args=(stream,), kwargs={"consume": list}) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(peak) == 1
@@ -0,0 +1,66 @@
+import itertools
+
+import pytest
+
+from utils import run_store
+from utils.run_store import (
+    STAGE_ANALYZE,
+    STAGE_EDIT,
+    STAGE_EXTRACT,
+    STAGE_GENERATE,
+    STAGE_REVIEW,
+    RunStore,
+)
+
+DOCUMENTS = [("brief_file", b"brief"), ("ko_file", b"kick-off")]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return RunStore(db_path=str(tmp_path / "runs.sqlite3"))
+
+
+def test_run_id_depends_on_owner_and_content():
+    assert RunStore.make_run_id(DOCUMENTS, "user:a") == RunStore.make_run_id(DOCUMENTS, "user:a")
+    assert RunStore.make_run_id(DOCUMENTS, "user:a") != RunStore.make_run_id(DOCUMENTS, "user:b")
+    assert RunStore.make_run_id(DOCUMENTS, "user:a") != RunStore.make_run_id(DOCUMENTS[:1], "user:a")
+
+
+def test_other_owner_cannot_see_the_run(store):
+    run_id = store.open_run(RunStore.make_run_id(DOCUMENTS, "user:a"), owner="user:a", label="brief.docx")
+    store.save_stage(run_id, STAGE_EXTRACT, {"full_text": "texto"})
+    store.set_processing_id(run_id, "quest_1")
+
+    assert store.load(run_id, owner="user:a") == {STAGE_EXTRACT: {"full_text": "texto"}}
+    assert store.find_by_processing_id("quest_1", "user:a") == run_id
+    assert [run["run_id"] for run in store.recent("user:a")] == [run_id]
+
+    assert store.load(run_id, owner="user:b") is None
+    assert store.find_by_processing_id("quest_1", "user:b") is None
+    assert store.recent("user:b") == []
+
+
+def test_reset_drops_the_stage_and_later_ones(store):
+    run_id = store.open_run("run", owner="user:a")
+    for stage in (STAGE_EXTRACT, STAGE_ANALYZE, STAGE_REVIEW, STAGE_GENERATE, STAGE_EDIT):
+        store.save_stage(run_id, stage, {"stage": stage})
+
+    store.reset(run_id, STAGE_REVIEW)
+    assert set(store.load(run_id)) == {STAGE_EXTRACT, STAGE_ANALYZE}
+    assert store.recent("user:a")[0]["stage"] == STAGE_ANALYZE
+
+    store.reset(run_id)
+    assert store.load(run_id) == {}
+    assert store.recent("user:a") == []
+
+
+def test_oldest_runs_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(run_store.time, "time", lambda: float(next(clock)))
+    store = RunStore(db_path=str(tmp_path / "runs.sqlite3"), max_runs=2)
+    for run_id in ("a", "b", "c"):
+        store.open_run(run_id, owner="user:a")
+        store.save_stage(run_id, STAGE_EXTRACT, {"run": run_id})
+
+    assert store.load("a") is None
+    assert store.load("c") == {STAGE_EXTRACT: {"run": "c"}}
@@ -0,0 +1,55 @@
+import pytest
+
+pytest.importorskip("PyPDF2")
+pytest.importorskip("openai")
+pytest.importorskip("streamlit")
+
+from utils import text_compactor
+from utils.document_processor import PDF_PAGE_SEPARATOR
+from utils.text_compactor import TextCompactor
+
+
+@pytest.fixture(autouse=True)
+def word_tokens(monkeypatch):
+    """Cuenta tokens por palabras: los tests no dependen de descargar la codificación de tiktoken"""
+    monkeypatch.setattr(text_compactor, "count_tokens", lambda text: len(text.split()))
+
+
+def compact(*documents):
+    return TextCompactor().compact(list(documents))[0]
+
+
+def test_docx_tables_and_numbers_are_kept():
+    text = "Rango | Casos\n18-24 | 100\n25-34 | 120\n35-44 | 80\n45-54 | 60\nTotal | 360\nMuestra total\n360"
+    assert compact(text) == [text]
+
+
+def test_pdf_headers_and_page_numbers_are_stripped_at_page_boundaries():
+    pages = [f"ACME Confidencial\nContenido de la página {i}\n300\n{i}" for i in range(1, 5)]
+    result = compact(PDF_PAGE_SEPARATOR.join(pages))[0]
+    assert "ACME Confidencial" not in result
+    assert result.count("300") == 4
+    assert "Contenido de la página 4" in result
+
+
+def test_dedup_only_across_documents():
+    paragraph = "Este párrafo largo aparece tanto en el brief como en el kick-off."
+    brief, ko = compact(f"{paragraph}\n{paragraph}", f"{paragraph}\nSolo en el KO")
+    assert brief.count(paragraph) == 2
+    assert ko == "Solo en el KO"
+
+
+def test_report_counts_saved_tokens():
+    paragraph = "Este párrafo largo aparece tanto en el brief como en el kick-off."
+    _, report = TextCompactor().compact([paragraph, f"{paragraph}\nSolo en el KO"])
+    assert report[1] == {"tokens_antes": 16, "tokens_despues": 4, "tokens_ahorrados": 12}
+
+
+def test_report_failure_does_not_break_compaction(monkeypatch):
+    def broken(text):
+        raise OSError("sin conexión para descargar la codificación")
+
+    monkeypatch.setattr(text_compactor, "count_tokens", broken)
+    compacted, report = TextCompactor().compact(["a   b\n\n\n\nc"])
+    assert compacted == ["a b\n\nc"]
+    assert report[0]["tokens_antes"] == 3 and report[0]["tokens_despues"] == 2
@@ -0,0 +1,116 @@
+import gzip
+import json
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("requests")
+pytest.importorskip("streamlit")
+
+from utils.make_receiver import STATUS_DONE, STATUS_ERROR, CallbackReceiver, ResultStore
+from utils.webhook_handler import WebhookHandler
+
+QUESTIONNAIRE = {"questions": [{"id": "P1", "text": "Edad"}]}
+
+
+class FakeMake:
+    """Servidor local que hace de escenario de Make
+
+    Responde al webhook con status y, si el payload trae callback_url,
+    entrega el cuestionario allí desde otro hilo (como hace Make).
+    """
+
+    def __init__(self, status=200):
+        self.status = status
+        self.payloads = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                if self.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                payload = json.loads(body)
+                fake.payloads.append(payload)
+
+                reply = json.dumps(QUESTIONNAIRE if "callback_url" not in payload else {"accepted": True})
+                self.send_response(fake.status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(reply.encode("utf-8"))
+
+                if fake.status == 200 and "callback_url" in payload:
+                    threading.Thread(target=fake.deliver, args=(payload["callback_url"],)).start()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/hook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def deliver(self, callback_url):
+        request = urllib.request.Request(
+            callback_url,
+            data=gzip.compress(json.dumps(QUESTIONNAIRE).encode("utf-8")),
+            headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+        )
+        urllib.request.urlopen(request, timeout=5).close()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def make():
+    fake = FakeMake()
+    yield fake
+    fake.close()
+
+
+@pytest.fixture
+def receiver():
+    receiver = CallbackReceiver(ResultStore(), port=0)
+    receiver.start()
+    yield receiver
+    receiver.stop()
+
+
+def test_synchronous_result_is_received_in_background(make):
+    handler = WebhookHandler(webhook_url=make.url, compress=True)
+    embedding = np.asarray([0.5, 0.25], dtype=np.float32)
+
+    assert handler.submit_to_make(embedding, {"marca": "Acme"}, "job") == (True, "job")
+    assert handler.receive_from_make("job", timeout=5) == (STATUS_DONE, QUESTIONNAIRE)
+    assert make.payloads[0]["embedding"] == [0.5, 0.25]
+    assert make.payloads[0]["processing_id"] == "job"
+
+
+def test_result_arrives_through_the_callback(make, receiver):
+    callback_url = f"http://{receiver.host}:{receiver.port}"
+    handler = WebhookHandler(webhook_url=make.url, result_store=receiver.result_store, callback_url=callback_url)
+
+    assert handler.submit_to_make([0.1], {}, "job") == (True, "job")
+    assert make.payloads[0]["callback_url"].startswith(f"{callback_url}/make/job?token=")
+    assert handler.receive_from_make("job", timeout=5) == (STATUS_DONE, QUESTIONNAIRE)
+
+
+def test_rejected_submission_is_recorded_as_error(receiver):
+    make = FakeMake(status=500)
+    try:
+        handler = WebhookHandler(
+            webhook_url=make.url,
+            result_store=receiver.result_store,
+            callback_url=f"http://{receiver.host}:{receiver.port}",
+        )
+        success, error = handler.submit_to_make([0.1], {}, "job")
+    finally:
+        make.close()
+
+    assert not success
+    assert handler.receive_from_make("job") == (STATUS_ERROR, error)
+    assert handler.receive_from_make("desconocido") is None
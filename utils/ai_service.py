@@ -1,18 +1,21 @@
 import openai
-import json
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import streamlit as st
+from utils.json_extraction import extract_json, IncrementalFieldParser, JSONExtractionError
 
-class AIService:
-    """Maneja servicios de IA para extracción de metadatos y embeddings"""
-    
-    def __init__(self):
-        self.client = openai.OpenAI(
-            api_key=st.secrets.get("OPENAI_API_KEY", "")
-        )
-    
-    def extract_metadata(self, full_text):
-        """Extrae metadatos usando GPT-4"""
-        metadata_prompt = f"""Actúa como extractor estructurado de metadata para la base de datos de briefs y KOs de estudios de investigación de mercados.
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+METADATA_MODEL = "gpt-4o"
+
+# Incrementar al modificar METADATA_PROMPT_TEMPLATE para invalidar el cache de respuestas
+METADATA_PROMPT_VERSION = "1"
+
+METADATA_PROMPT_TEMPLATE = """Actúa como extractor estructurado de metadata para la base de datos de briefs y KOs de estudios de investigación de mercados.
 
 Voy a proporcionarte el texto completo de un Brief y/o su KO (Kick Off). A veces ambos, a veces solo uno.
 
@@ -53,42 +56,370 @@ Aquí está el texto completo:
 
 {full_text}"""
 
-        try:
-            chat_response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "Eres un experto en extracción estructurada de metadata."},
-                    {"role": "user", "content": metadata_prompt}
-                ],
-                temperature=0
-            )
+# Por encima de este tamaño (en tokens) los metadatos se extraen por secciones (map-reduce).
+# Ambos tamaños se reducen si el límite de tokens por minuto del chat es menor
+# (ver AIService._metadata_sizes)
+METADATA_MAX_INPUT_TOKENS = 60000
+METADATA_SECTION_TOKENS = 30000
+METADATA_SECTION_OVERLAP = 500
 
-            metadata_json_str = chat_response.choices[0].message.content
-            
-            # Limpiar si viene con bloque de código
-            if metadata_json_str.startswith("```json"):
-                metadata_json_str = metadata_json_str.lstrip("```json").rstrip("```").strip()
-            elif metadata_json_str.startswith("```"):
-                metadata_json_str = metadata_json_str.lstrip("```").rstrip("```").strip()
+# Tokens de salida estimados por respuesta (para el limitador de tokens por minuto)
+METADATA_OUTPUT_TOKENS = 1000
+
+# Máximo de extracciones parciales simultáneas
+METADATA_MAP_CONCURRENCY = 4
+
+METADATA_SECTION_HEADER = "[Sección {index} de {total} de un documento más largo]\n\n"
+
+# Margen por las diferencias de tokenización al cortar y unir el texto
+METADATA_TOKEN_MARGIN = 64
+
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Tamaño de cada fragmento y solapamiento entre fragmentos consecutivos (en tokens)
+EMBEDDING_CHUNK_TOKENS = 2000
+EMBEDDING_CHUNK_OVERLAP = 200
+
+# Límites por petición de embeddings.create
+EMBEDDING_BATCH_TOKENS = 250000
+EMBEDDING_BATCH_INPUTS = 2048
+
+# Aproximación de caracteres por token cuando tiktoken no está disponible
+_CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=1)
+def _load_encoding():
+    """Carga cl100k_base una sola vez; None si no se puede (p. ej. sin red para descargarla)"""
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+def _get_encoding():
+    """Codificación de tiktoken, o None para estimar por caracteres"""
+    if tiktoken is None:
+        return None
+    return _load_encoding()
+
+def count_tokens(text):
+    """Cuenta tokens con tiktoken o los estima por caracteres"""
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return -(-len(text) // _CHARS_PER_TOKEN)
+
+def _normalize_value(value):
+    """Normaliza un valor de texto para compararlo entre secciones"""
+    return " ".join(str(value).split()).lower()
+
+def merge_partial_metadata(partials):
+    """Combina metadatos extraídos de varias secciones en el esquema original
+    
+    Las listas se unen sin duplicados, los booleanos son verdaderos si alguna
+    sección lo indica, y los campos de texto toman el valor que más secciones
+    coinciden en extraer (a igualdad, el de la sección más temprana).
+    """
+    merged = {}
+    for key in dict.fromkeys(key for partial in partials for key in partial):
+        values = [partial[key] for partial in partials if key in partial]
+        
+        if any(isinstance(value, list) for value in values):
+            seen = set()
+            items = []
+            for value in values:
+                for item in value if isinstance(value, list) else [value]:
+                    normalized = _normalize_value(item)
+                    if normalized and normalized not in seen:
+                        seen.add(normalized)
+                        items.append(item)
+            merged[key] = items
+        elif any(isinstance(value, bool) for value in values):
+            merged[key] = any(value is True for value in values)
+        else:
+            votes = {}
+            for position, value in enumerate(values):
+                normalized = _normalize_value(value) if value is not None else ""
+                if not normalized:
+                    continue
+                count, first, original = votes.get(normalized, (0, position, value))
+                votes[normalized] = (count + 1, first, original)
+            if votes:
+                merged[key] = max(votes.values(), key=lambda vote: (vote[0], -vote[1]))[2]
+            else:
+                merged[key] = ""
+    return merged
+
+def chunk_text_by_tokens(text, max_tokens=EMBEDDING_CHUNK_TOKENS, overlap=EMBEDDING_CHUNK_OVERLAP):
+    """Divide el texto en fragmentos de hasta max_tokens con solapamiento
+    
+    Devuelve una lista de tuplas (fragmento, número de tokens).
+    """
+    step = max(max_tokens - overlap, 1)
+    
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        return [
+            (encoding.decode(tokens[start:start + max_tokens]), len(tokens[start:start + max_tokens]))
+            for start in range(0, len(tokens), step)
+            if start == 0 or start + overlap < len(tokens)
+        ]
+    
+    # Sin tiktoken se aproxima por caracteres
+    max_chars = max_tokens * _CHARS_PER_TOKEN
+    step_chars = step * _CHARS_PER_TOKEN
+    overlap_chars = overlap * _CHARS_PER_TOKEN
+    return [
+        (text[start:start + max_chars], -(-len(text[start:start + max_chars]) // _CHARS_PER_TOKEN))
+        for start in range(0, len(text), step_chars)
+        if start == 0 or start + overlap_chars < len(text)
+    ]
 
-            metadata_dict = json.loads(metadata_json_str)
+def pool_embeddings(vectors, weights):
+    """Combina embeddings de fragmentos en un único vector (media ponderada normalizada)"""
+    matrix = np.asarray(vectors, dtype=np.float32)
+    pooled = np.average(matrix, axis=0, weights=np.asarray(weights, dtype=np.float32))
+    norm = np.linalg.norm(pooled)
+    if norm > 0:
+        pooled = pooled / norm
+    return pooled
+
+class AIService:
+    """Maneja servicios de IA para extracción de metadatos y embeddings"""
+    
+    def __init__(self, embedding_cache=None, response_cache=None, client=None, rate_limiter=None):
+        self.client = client or openai.OpenAI(
+            api_key=st.secrets.get("OPENAI_API_KEY", "")
+        )
+        self.embedding_cache = embedding_cache
+        self.response_cache = response_cache
+        self.rate_limiter = rate_limiter
+    
+    def extract_metadata(self, full_text, force_refresh=False, on_field=None, raise_errors=False):
+        """Extrae metadatos usando GPT-4
+        
+        force_refresh ignora el cache de respuestas. Con on_field la respuesta
+        se recibe en streaming y on_field(clave, valor) se llama con cada campo
+        en cuanto el modelo lo termina de escribir. Con raise_errors los errores
+        se propagan en lugar de mostrarse con st.error (para hilos sin interfaz).
+        """
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.make_key(METADATA_MODEL, METADATA_PROMPT_VERSION, full_text)
+            if not force_refresh:
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    if on_field is not None:
+                        for key, value in cached.items():
+                            on_field(key, value)
+                    return cached
+        
+        try:
+            max_input_tokens, section_tokens = self._metadata_sizes()
+            if count_tokens(full_text) > max_input_tokens:
+                metadata_dict = self._extract_metadata_map_reduce(full_text, section_tokens)
+                if on_field is not None:
+                    for key, value in metadata_dict.items():
+                        on_field(key, value)
+            else:
+                metadata_dict = self._extract_metadata_single(full_text, on_field)
+            
+            if cache_key is not None:
+                self.response_cache.put(cache_key, metadata_dict)
             return metadata_dict
             
-        except json.JSONDecodeError as e:
+        except JSONExtractionError as e:
+            if raise_errors:
+                raise
             st.error(f"Error al parsear JSON: {e}")
             return {}
         except Exception as e:
+            if raise_errors:
+                raise
             st.error(f"Error al extraer metadatos: {e}")
             return {}
     
-    def generate_embedding(self, text):
-        """Genera embedding usando OpenAI"""
-        try:
-            response = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
+    def _metadata_messages(self, full_text):
+        """Mensajes del chat para extraer metadatos de un texto"""
+        return [
+            {"role": "system", "content": "Eres un experto en extracción estructurada de metadata."},
+            {"role": "user", "content": METADATA_PROMPT_TEMPLATE.format(full_text=full_text)}
+        ]
+    
+    def _call(self, endpoint, func, tokens=0, consume=None, **kwargs):
+        """Llama a la API a través del limitador compartido, si lo hay
+        
+        consume(respuesta) se ejecuta dentro de la misma llamada limitada
+        (p. ej. para leer un stream ocupando su hueco de concurrencia).
+        """
+        if self.rate_limiter is None:
+            response = func(**kwargs)
+            return consume(response) if consume is not None else response
+        return self.rate_limiter.call(endpoint, func, tokens=tokens, consume=consume, **kwargs)
+    
+    def _metadata_sizes(self):
+        """Tamaño máximo de una petición única y de cada sección, en tokens
+        
+        Una petición mayor que el límite de tokens por minuto del chat nunca
+        pasaría el limitador, así que ambos tamaños se acotan a lo que cabe
+        en él junto con el prompt y la salida.
+        """
+        capacity = self.rate_limiter.token_capacity("chat") if self.rate_limiter is not None else None
+        if capacity is None:
+            return METADATA_MAX_INPUT_TOKENS, METADATA_SECTION_TOKENS
+        
+        overhead = (
+            count_tokens(METADATA_PROMPT_TEMPLATE.format(full_text=""))
+            + count_tokens(METADATA_SECTION_HEADER.format(index=0, total=0))
+            + METADATA_OUTPUT_TOKENS
+            + METADATA_TOKEN_MARGIN
+        )
+        budget = int(capacity) - overhead
+        if budget <= METADATA_SECTION_OVERLAP:
+            raise ValueError(
+                f"el límite de {capacity:.0f} tokens por minuto del chat no alcanza para extraer metadatos"
             )
-            return response.data[0].embedding
+        return min(METADATA_MAX_INPUT_TOKENS, budget), min(METADATA_SECTION_TOKENS, budget)
+    
+    def _extract_metadata_single(self, full_text, on_field=None):
+        """Extrae metadatos de un texto que cabe en una sola petición"""
+        messages = self._metadata_messages(full_text)
+        tokens = count_tokens(messages[1]["content"]) + METADATA_OUTPUT_TOKENS
+        if on_field is None:
+            chat_response = self._call(
+                "chat",
+                self.client.chat.completions.create,
+                tokens=tokens,
+                model=METADATA_MODEL,
+                messages=messages,
+                temperature=0
+            )
+            metadata_json_str = chat_response.choices[0].message.content
+        else:
+            metadata_json_str = self._stream_metadata(messages, on_field, tokens)
+        
+        # Extraer el JSON (con o sin bloque de código) en una sola pasada
+        return extract_json(metadata_json_str)
+    
+    def _extract_metadata_map_reduce(self, full_text, section_tokens):
+        """Extrae metadatos por secciones en paralelo y combina los resultados"""
+        sections = [
+            section for section, _ in
+            chunk_text_by_tokens(full_text, section_tokens, METADATA_SECTION_OVERLAP)
+        ]
+        total = len(sections)
+        
+        def extract_section(index):
+            header = METADATA_SECTION_HEADER.format(index=index + 1, total=total)
+            return self._extract_metadata_single(header + sections[index])
+        
+        # Un resultado parcial se guardaría 7 días en el cache como si fuera
+        # completo: el primer error de una sección se propaga tal cual
+        with ThreadPoolExecutor(max_workers=min(METADATA_MAP_CONCURRENCY, total)) as executor:
+            futures = [executor.submit(extract_section, index) for index in range(total)]
+            try:
+                results = [future.result() for future in futures]
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+        
+        partials = [partial for partial in results if isinstance(partial, dict) and partial]
+        if not partials:
+            raise ValueError("ninguna sección del documento devolvió metadatos")
+        return merge_partial_metadata(partials)
+    
+    def _stream_metadata(self, messages, on_field, tokens=0):
+        """Recibe la respuesta en streaming, notificando cada campo completado
+        
+        El stream se lee dentro de la llamada limitada: ocupa su hueco de
+        concurrencia hasta terminar y un error a mitad de lectura se reintenta.
+        """
+        def read(stream):
+            parser = IncrementalFieldParser()
+            parts = []
+            with stream:
+                for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    for key, value in parser.feed(delta):
+                        on_field(key, value)
+            return "".join(parts)
+        
+        return self._call(
+            "chat",
+            self.client.chat.completions.create,
+            tokens=tokens,
+            consume=read,
+            model=METADATA_MODEL,
+            messages=messages,
+            temperature=0,
+            stream=True
+        )
+    
+    def generate_chunk_embeddings(self, text):
+        """Genera embeddings por fragmento, agrupando fragmentos en pocas peticiones
+        
+        Devuelve una lista de tuplas (fragmento, número de tokens, embedding).
+        """
+        chunks = chunk_text_by_tokens(text)
+        
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for chunk, n_tokens in chunks:
+            if batch and (batch_tokens + n_tokens > EMBEDDING_BATCH_TOKENS or len(batch) >= EMBEDDING_BATCH_INPUTS):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append((chunk, n_tokens))
+            batch_tokens += n_tokens
+        if batch:
+            batches.append(batch)
+        
+        results = []
+        for batch in batches:
+            response = self._call(
+                "embeddings",
+                self.client.embeddings.create,
+                tokens=sum(n_tokens for _, n_tokens in batch),
+                model=EMBEDDING_MODEL,
+                input=[chunk for chunk, _ in batch]
+            )
+            ordered = sorted(response.data, key=lambda item: item.index)
+            for (chunk, n_tokens), item in zip(batch, ordered):
+                results.append((chunk, n_tokens, item.embedding))
+        return results
+    
+    def generate_embedding(self, text, raise_errors=False):
+        """Genera embedding usando OpenAI (raise_errors propaga los errores)"""
+        try:
+            if self.embedding_cache is not None:
+                cached = self.embedding_cache.get(EMBEDDING_MODEL, text)
+                if cached is not None:
+                    return cached.tolist()
+            
+            chunk_embeddings = self.generate_chunk_embeddings(text)
+            if not chunk_embeddings:
+                raise ValueError("el texto está vacío")
+            
+            if len(chunk_embeddings) == 1:
+                embedding = chunk_embeddings[0][2]
+            else:
+                embedding = pool_embeddings(
+                    [vector for _, _, vector in chunk_embeddings],
+                    [n_tokens for _, n_tokens, _ in chunk_embeddings]
+                ).tolist()
+            
+            if self.embedding_cache is not None:
+                self.embedding_cache.put(EMBEDDING_MODEL, text, embedding)
+            return embedding
         except Exception as e:
+            if raise_errors:
+                raise
             st.error(f"Error al generar embedding: {e}")
             return None
\ No newline at end of file
@@ -0,0 +1,72 @@
+import threading
+import httpx
+import openai
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_POOL_SIZE = 20
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 180.0
+
+# Reintentos internos del SDK de OpenAI (el RateLimiter compartido ya reintenta)
+DEFAULT_MAX_RETRIES = 0
+
+
+class ClientRegistry:
+    """Registro thread-safe de clientes OpenAI y HTTP con pools de conexiones keep-alive"""
+
+    def __init__(self, openai_api_key="", pool_size=DEFAULT_POOL_SIZE,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                 max_retries=DEFAULT_MAX_RETRIES):
+        self.openai_api_key = openai_api_key
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self._openai_client = None
+        self._http_session = None
+        self._lock = threading.Lock()
+
+    def openai_client(self):
+        """Cliente OpenAI compartido, creado la primera vez que se pide"""
+        with self._lock:
+            if self._openai_client is None:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.pool_size,
+                        max_keepalive_connections=self.pool_size
+                    ),
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+                )
+                self._openai_client = openai.OpenAI(
+                    api_key=self.openai_api_key,
+                    http_client=http_client,
+                    max_retries=self.max_retries
+                )
+            return self._openai_client
+
+    def http_session(self):
+        """Sesión de requests compartida con pool de conexiones keep-alive"""
+        with self._lock:
+            if self._http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._http_session = session
+            return self._http_session
+
+    @property
+    def timeout(self):
+        """Timeout (conexión, lectura) para peticiones con requests"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def close(self):
+        """Cierra los clientes abiertos"""
+        with self._lock:
+            if self._openai_client is not None:
+                self._openai_client.close()
+                self._openai_client = None
+            if self._http_session is not None:
+                self._http_session.close()
+                self._http_session = None
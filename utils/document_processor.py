@@ -1,12 +1,133 @@
-import docx
+import atexit
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
 import PyPDF2
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 
+# Incrementar cuando cambie la forma de extraer texto para invalidar el cache
+EXTRACTOR_VERSION = "5"
+
+# Espacio de nombres de WordprocessingML
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+# Separador entre celdas de una fila de tabla DOCX
+DOCX_CELL_SEPARATOR = " | "
+
+# Separador entre páginas de un PDF (salto de página, para que el compactor
+# pueda reconocer encabezados y pies en los límites de página)
+PDF_PAGE_SEPARATOR = "\f"
+
+# Por debajo de este número de páginas se extrae en serie
+PDF_PARALLEL_MIN_PAGES = 40
+
+# Pool de procesos compartido por todas las extracciones de PDF del proceso
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool(max_workers):
+    """Devuelve el pool de procesos compartido, creándolo la primera vez
+    
+    Se usa forkserver (o spawn) en lugar de fork: el servidor es
+    multihilo y hacer fork desde un hilo puede heredar locks tomados.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pdf_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+            atexit.register(_pdf_pool.shutdown, wait=False)
+        return _pdf_pool
+
+def _extract_pdf_page_range(path, start, end):
+    """Extrae el texto de las páginas [start, end) de un PDF (ejecutado en un proceso hijo)"""
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+def iter_docx_text(source):
+    """Genera los párrafos y filas de tabla de un DOCX en orden de documento
+    
+    Lee word/document.xml en streaming desde el zip, sin construir el modelo
+    de python-docx, y libera cada bloque una vez emitido.
+    """
+    with zipfile.ZipFile(source) as archive, archive.open("word/document.xml") as xml_file:
+        body = None
+        runs = []
+        cells = []
+        rows = []
+        
+        for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+            tag = elem.tag
+            
+            if event == "start":
+                if tag == _W + "body":
+                    body = elem
+                elif tag == _W + "tr":
+                    rows.append([])
+                elif tag == _W + "tc":
+                    cells.append([])
+                continue
+            
+            if tag == _W + "t":
+                runs.append(elem.text or "")
+            elif tag == _W + "tab":
+                runs.append("\t")
+            elif tag in (_W + "br", _W + "cr"):
+                runs.append("\n")
+            elif tag == _W + "p":
+                text = "".join(runs)
+                runs = []
+                if cells:
+                    cells[-1].append(text)
+                else:
+                    yield text
+                    if body is not None:
+                        body.clear()
+            elif tag == _W + "tc":
+                paragraphs = cells.pop()
+                rows[-1].append("\n".join(p for p in paragraphs if p))
+            elif tag == _W + "tr":
+                row_cells = rows.pop()
+                # Filas de relleno (celdas vacías o continuación de una combinación vertical)
+                if not any(cell.strip() for cell in row_cells):
+                    continue
+                row = DOCX_CELL_SEPARATOR.join(row_cells)
+                if cells:
+                    # Tabla anidada dentro de una celda
+                    cells[-1].append(row)
+                else:
+                    yield row
+            elif tag == _W + "tbl" and not cells and body is not None:
+                body.clear()
+
 class DocumentProcessor:
     """Maneja la extracción de texto de diferentes tipos de documentos"""
     
+    def __init__(self, cache=None, pdf_workers=None, pdf_parallel_min_pages=PDF_PARALLEL_MIN_PAGES):
+        self.cache = cache
+        self.pdf_workers = pdf_workers or os.cpu_count() or 1
+        self.pdf_parallel_min_pages = pdf_parallel_min_pages
+    
     def extract_text(self, file):
         """Extrae texto según el tipo de archivo"""
+        if self.cache is None:
+            return self._extract_uncached(file)
+        
+        key = self.cache.make_key(file.getvalue(), file.type, EXTRACTOR_VERSION)
+        text = self.cache.get(key)
+        if text is None:
+            text = self._extract_uncached(file)
+            self.cache.put(key, text)
+        return text
+    
+    def _extract_uncached(self, file):
+        """Despacha al extractor correspondiente sin consultar el cache"""
         if file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
             return self._extract_from_docx(file)
         elif file.type == "application/pdf":
@@ -18,13 +139,43 @@ class DocumentProcessor:
     
     def _extract_from_docx(self, file):
         """Extrae texto de archivo DOCX"""
-        doc = docx.Document(file)
-        return "\n".join([para.text for para in doc.paragraphs])
+        return "\n".join(iter_docx_text(file))
     
     def _extract_from_pdf(self, file):
         """Extrae texto de archivo PDF"""
-        reader = PyPDF2.PdfReader(file)
-        return "".join([page.extract_text() or "" for page in reader.pages])
+        data = file.getvalue()
+        reader = PyPDF2.PdfReader(BytesIO(data))
+        num_pages = len(reader.pages)
+        
+        if self.pdf_workers <= 1 or num_pages < self.pdf_parallel_min_pages:
+            pages = [page.extract_text() or "" for page in reader.pages]
+        else:
+            pages = self._extract_pdf_parallel(data, num_pages)
+        
+        return PDF_PAGE_SEPARATOR.join(pages)
+    
+    def _extract_pdf_parallel(self, data, num_pages):
+        """Reparte rangos de páginas entre el pool de procesos y los reensambla en orden
+        
+        Los procesos leen el PDF de un archivo temporal en lugar de recibir
+        una copia de los bytes cada uno.
+        """
+        workers = min(self.pdf_workers, num_pages)
+        shard_size = -(-num_pages // workers)
+        ranges = [(start, min(start + shard_size, num_pages)) for start in range(0, num_pages, shard_size)]
+        
+        fd, path = tempfile.mkstemp(suffix=".pdf")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            executor = _get_pdf_pool(self.pdf_workers)
+            futures = [executor.submit(_extract_pdf_page_range, path, start, end) for start, end in ranges]
+            pages = []
+            for future in futures:
+                pages.extend(future.result())
+            return pages
+        finally:
+            os.remove(path)
     
     def _extract_from_txt(self, file):
         """Extrae texto de archivo TXT"""
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import numpy as np
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "ai_quest_cache", "embeddings.sqlite3")
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class EmbeddingCache:
+    """Almacén persistente de embeddings en SQLite, indexado por modelo y hash del texto"""
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+
+    @staticmethod
+    def hash_text(text):
+        """Hash sha256 del texto normalizado (espacios colapsados)"""
+        normalized = _WHITESPACE_RE.sub(" ", text).strip()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get(self, model, text):
+        """Devuelve el embedding cacheado como array float32 o None"""
+        text_hash = self.hash_text(text)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vector, created_at FROM embeddings WHERE model = ? AND text_hash = ?",
+                (model, text_hash)
+            ).fetchone()
+
+            if row is None or now - row[1] > self.max_age:
+                self.misses += 1
+                return None
+
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    (now, model, text_hash)
+                )
+            self.hits += 1
+        return np.frombuffer(row[0], dtype=np.float32)
+
+    def put(self, model, text, vector):
+        """Guarda un embedding y aplica la política de expulsión"""
+        text_hash = self.hash_text(text)
+        blob = np.asarray(vector, dtype=np.float32).tobytes()
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (model, text_hash, blob, now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        """Elimina entradas caducadas y las menos usadas por encima de max_entries"""
+        self._conn.execute("DELETE FROM embeddings WHERE created_at < ?", (now - self.max_age,))
+        self._conn.execute(
+            """DELETE FROM embeddings WHERE rowid IN (
+                SELECT rowid FROM embeddings ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )""",
+            (self.max_entries,)
+        )
+
+    def stats(self):
+        """Devuelve contadores de aciertos, fallos y número de entradas"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
@@ -0,0 +1,77 @@
+import base64
+import gzip
+import json
+import numpy as np
+
+ENCODING_FLOAT32 = "float32"
+ENCODING_FLOAT16 = "float16"
+ENCODING_INT8 = "int8"
+
+_DTYPES = {
+    ENCODING_FLOAT32: np.float32,
+    ENCODING_FLOAT16: np.float16,
+}
+
+
+def encode_embedding(vector, encoding=ENCODING_FLOAT32):
+    """Codifica un embedding en base64 (float32, float16 o int8 cuantizado con escala)"""
+    array = np.asarray(vector, dtype=np.float32)
+
+    if encoding == ENCODING_INT8:
+        max_abs = float(np.max(np.abs(array))) if array.size else 0.0
+        scale = max_abs / 127 if max_abs > 0 else 1.0
+        quantized = np.clip(np.rint(array / scale), -127, 127).astype(np.int8)
+        return {
+            "encoding": ENCODING_INT8,
+            "dim": int(array.size),
+            "scale": scale,
+            "data": base64.b64encode(quantized.tobytes()).decode("ascii"),
+        }
+
+    if encoding not in _DTYPES:
+        raise ValueError(f"Codificación de embedding no soportada: {encoding}")
+
+    # Little-endian explícito para que el receptor no dependa de la plataforma
+    data = array.astype(np.dtype(_DTYPES[encoding]).newbyteorder("<")).tobytes()
+    return {
+        "encoding": encoding,
+        "dim": int(array.size),
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def decode_embedding(payload):
+    """Decodifica un embedding a un array float32 (acepta también listas JSON)"""
+    if isinstance(payload, list):
+        return np.asarray(payload, dtype=np.float32)
+
+    encoding = payload.get("encoding")
+    raw = base64.b64decode(payload["data"])
+
+    if encoding == ENCODING_INT8:
+        return np.frombuffer(raw, dtype=np.int8).astype(np.float32) * np.float32(payload["scale"])
+
+    if encoding not in _DTYPES:
+        raise ValueError(f"Codificación de embedding no soportada: {encoding}")
+
+    return np.frombuffer(raw, dtype=np.dtype(_DTYPES[encoding]).newbyteorder("<")).astype(np.float32)
+
+
+def encode_json_body(payload, compress=False):
+    """Serializa un payload a JSON compacto, opcionalmente comprimido con gzip
+
+    Devuelve (bytes, cabeceras).
+    """
+    body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if compress:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def decode_json_body(body, content_encoding=None):
+    """Decodifica un cuerpo JSON recibido, descomprimiendo gzip si corresponde"""
+    if content_encoding == "gzip":
+        body = gzip.decompress(body)
+    return json.loads(body.decode("utf-8"))
@@ -1,8 +1,15 @@
-import json
 import pandas as pd
 import io
-import re
 from typing import Dict, List, Optional
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+from utils.questionnaire import Questionnaire
+from utils.json_extraction import extract_json, find_json_span, JSONExtractionError
+
+MAX_COLUMN_WIDTH = 50
+HEADER_FONT = Font(bold=True)
 
 class ExcelConverter:
     """Convierte respuestas JSON a archivos Excel"""
@@ -10,78 +17,84 @@ class ExcelConverter:
     def clean_json_content(self, content: str) -> str:
         """Limpia el contenido de texto para extraer JSON válido"""
         content = content.strip()
-        
-        json_pattern = r'```(?:json)?\s*(.*?)\s*```'
-        match = re.search(json_pattern, content, re.DOTALL | re.IGNORECASE)
-        
-        if match:
-            content = match.group(1).strip()
-        
-        return content
+        try:
+            start, end = find_json_span(content)
+        except JSONExtractionError:
+            return content
+        return content[start:end]
     
     def load_json_from_content(self, content: str) -> Optional[Dict]:
         """Carga JSON desde contenido de texto"""
         try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            try:
-                cleaned_content = self.clean_json_content(content)
-                return json.loads(cleaned_content)
-            except json.JSONDecodeError as e:
-                raise ValueError(f"Error al parsear JSON: {str(e)}")
+            return extract_json(content)
+        except JSONExtractionError as e:
+            raise ValueError(f"Error al parsear JSON: {str(e)}")
     
     def questions_to_dataframe(self, questions: List[Dict]) -> pd.DataFrame:
         """Convierte lista de preguntas a DataFrame"""
-        rows = []
-        for q in questions:
-            # Limpieza básica de saltos de línea en opciones (igual que app.py)
-            opts = q.get('Opciones de respuesta', '')
-            opts = opts.replace('\r\n', ', ').strip()
-            
-            rows.append({
-                'modulo': q.get('KPI base o Modulo', ''),
-                'id': q.get('No. Pregunta', ''),
-                'texto': q.get('Pregunta', ''),
-                'tipo': q.get('Tipo de respuesta', ''),
-                'opciones': opts,
-                'indicador': q.get('Indicador', ''),
-                'logica': q.get('Lógica de programación', '')
-            })
-        return pd.DataFrame(rows)
+        return Questionnaire.from_make({'questions': questions}).to_export_frame()
+    
+    def column_widths(self, df: pd.DataFrame) -> List[int]:
+        """Calcula el ancho de cada columna a partir de los datos (máximo 50)"""
+        widths = []
+        for name in df.columns:
+            lengths = df[name].astype(str).str.len()
+            max_length = max(len(str(name)), int(lengths.max()) if len(lengths) else 0)
+            widths.append(min(max_length + 2, MAX_COLUMN_WIDTH))
+        return widths
+    
+    def _column_letters(self, df: pd.DataFrame) -> List[str]:
+        """Letras de columna de Excel para cada columna del DataFrame"""
+        return [get_column_letter(i) for i in range(1, len(df.columns) + 1)]
     
     def json_to_excel(self, json_content: str) -> bytes:
         """Convierte JSON a archivo Excel y retorna los bytes"""
         try:
             # Cargar JSON
             data = self.load_json_from_content(json_content)
-            
-            # Extraer preguntas
-            questions = data.get('questions', [])
-            if not questions:
+        except Exception as e:
+            raise ValueError(f"Error al convertir a Excel: {str(e)}")
+        
+        return self.data_to_excel(data)
+    
+    def data_to_excel(self, data: Dict) -> bytes:
+        """Convierte un cuestionario ya parseado a archivo Excel y retorna los bytes"""
+        try:
+            questionnaire = Questionnaire.from_make(data)
+        except Exception as e:
+            raise ValueError(f"Error al convertir a Excel: {str(e)}")
+        
+        return self.questionnaire_to_excel(questionnaire)
+    
+    def questionnaire_to_excel(self, questionnaire: Questionnaire) -> bytes:
+        """Convierte un Questionnaire a archivo Excel y retorna los bytes"""
+        try:
+            if not len(questionnaire):
                 raise ValueError("No se encontraron preguntas en el JSON")
             
             # Convertir a DataFrame
-            df = self.questions_to_dataframe(questions)
+            df = questionnaire.to_export_frame()
             
-            # Crear Excel en memoria
+            # Crear Excel en memoria en modo streaming (solo escritura)
             output = io.BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Preguntas', index=False)
-                
-                # Ajustar anchos de columnas
-                worksheet = writer.sheets['Preguntas']
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
+            workbook = Workbook(write_only=True)
+            worksheet = workbook.create_sheet('Preguntas')
+            
+            # Los anchos deben fijarse antes de escribir filas en modo write-only
+            for column_letter, width in zip(self._column_letters(df), self.column_widths(df)):
+                worksheet.column_dimensions[column_letter].width = width
+            
+            header = []
+            for name in df.columns:
+                cell = WriteOnlyCell(worksheet, value=name)
+                cell.font = HEADER_FONT
+                header.append(cell)
+            worksheet.append(header)
+            
+            for row in df.itertuples(index=False, name=None):
+                worksheet.append(row)
             
+            workbook.save(output)
             output.seek(0)
             return output.getvalue()
             
@@ -0,0 +1,135 @@
+import io
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Dict, List
+from utils.excel_converter import ExcelConverter
+from utils.questionnaire import Questionnaire
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Filas por bloque al escribir formatos de texto y row groups de Parquet
+EXPORT_CHUNK_ROWS = 5000
+
+
+class Exporter(ABC):
+    """Exportador base: escribe un Questionnaire en un archivo binario"""
+
+    name = ''
+    label = ''
+    extension = ''
+    mime = 'application/octet-stream'
+
+    def available(self) -> bool:
+        """Indica si las dependencias del formato están instaladas"""
+        return True
+
+    def write(self, questionnaire: Questionnaire, output: BinaryIO) -> None:
+        """Escribe el cuestionario; todos los formatos rechazan uno sin preguntas"""
+        if not len(questionnaire):
+            raise ValueError("No se encontraron preguntas en el JSON")
+        self._write(questionnaire, output)
+
+    @abstractmethod
+    def _write(self, questionnaire: Questionnaire, output: BinaryIO) -> None:
+        """Escribe un cuestionario con al menos una pregunta en el formato concreto"""
+
+    def to_bytes(self, questionnaire: Questionnaire) -> bytes:
+        """Exporta el cuestionario a bytes en memoria"""
+        output = io.BytesIO()
+        self.write(questionnaire, output)
+        return output.getvalue()
+
+
+class ExcelExporter(Exporter):
+    name = 'xlsx'
+    label = 'Excel (.xlsx)'
+    extension = 'xlsx'
+    mime = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    def _write(self, questionnaire, output):
+        output.write(ExcelConverter().questionnaire_to_excel(questionnaire))
+
+
+class CsvExporter(Exporter):
+    name = 'csv'
+    label = 'CSV (.csv)'
+    extension = 'csv'
+    mime = 'text/csv'
+
+    def _write(self, questionnaire, output):
+        text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+        try:
+            for i, frame in enumerate(questionnaire.iter_export_frames(EXPORT_CHUNK_ROWS)):
+                frame.to_csv(text, header=(i == 0), index=False)
+        finally:
+            text.flush()
+            text.detach()
+
+
+class JsonLinesExporter(Exporter):
+    name = 'jsonl'
+    label = 'JSON Lines (.jsonl)'
+    extension = 'jsonl'
+    mime = 'application/x-ndjson'
+
+    def _write(self, questionnaire, output):
+        for frame in questionnaire.iter_export_frames(EXPORT_CHUNK_ROWS):
+            chunk = frame.to_json(orient='records', lines=True, force_ascii=False)
+            output.write(chunk.encode('utf-8'))
+            if chunk and not chunk.endswith('\n'):
+                output.write(b'\n')
+
+
+class ParquetExporter(Exporter):
+    name = 'parquet'
+    label = 'Parquet (.parquet)'
+    extension = 'parquet'
+    mime = 'application/vnd.apache.parquet'
+
+    def available(self):
+        return pq is not None
+
+    def _write(self, questionnaire, output):
+        if pq is None:
+            raise ValueError("La exportación a Parquet requiere pyarrow")
+
+        writer = None
+        try:
+            for frame in questionnaire.iter_export_frames(EXPORT_CHUNK_ROWS):
+                # Todas las columnas como texto para un esquema estable entre bloques
+                table = pa.Table.from_pandas(frame.fillna('').astype(str), preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+EXPORTERS: Dict[str, Exporter] = {
+    exporter.name: exporter
+    for exporter in (ExcelExporter(), CsvExporter(), JsonLinesExporter(), ParquetExporter())
+}
+
+
+def available_formats() -> List[str]:
+    """Formatos de exportación con dependencias disponibles"""
+    return [name for name, exporter in EXPORTERS.items() if exporter.available()]
+
+
+def get_exporter(name: str) -> Exporter:
+    """Devuelve el exportador de un formato"""
+    try:
+        return EXPORTERS[name]
+    except KeyError:
+        raise ValueError(f"Formato de exportación no soportado: {name}")
+
+
+def export_to_file(questionnaire: Questionnaire, name: str, path: str) -> None:
+    """Escribe el cuestionario directamente a un archivo en el formato indicado"""
+    with open(path, 'wb') as f:
+        get_exporter(name).write(questionnaire, f)
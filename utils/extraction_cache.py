@@ -0,0 +1,112 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), "ai_quest_cache", "extraction")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+class ExtractionCache:
+    """Cache en disco del texto extraído, direccionado por contenido"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(data, file_type, version):
+        """Calcula la clave a partir de los bytes del archivo y la versión del extractor"""
+        digest = hashlib.sha256()
+        digest.update(f"{version}\0{file_type}\0".encode("utf-8"))
+        digest.update(memoryview(data))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def get(self, key):
+        """Devuelve el texto cacheado o None si no existe"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Actualizar mtime para que la expulsión sea LRU
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key, text):
+        """Guarda el texto extraído y expulsa entradas antiguas si se supera el límite"""
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        """Elimina las entradas usadas menos recientemente hasta respetar max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".txt"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _, size, name in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Vacía el cache"""
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".txt"):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        """Devuelve contadores de aciertos y fallos"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,117 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_MAX_AGE = 3600
+
+STATUS_PENDING = "pending"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+
+class Job:
+    """Trabajo en segundo plano con estado, progreso y resultados parciales"""
+
+    def __init__(self, key, owner):
+        self.key = key
+        self.owner = owner
+        self.status = STATUS_PENDING
+        self.progress = 0.0
+        self.message = ""
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def update(self, progress=None, message=None, **partial):
+        """Actualiza el progreso y publica resultados parciales"""
+        with self._lock:
+            if progress is not None:
+                self.progress = progress
+            if message is not None:
+                self.message = message
+            self.partial.update(partial)
+            self.updated_at = time.time()
+
+    def snapshot(self):
+        """Copia consistente del estado para mostrarla en la interfaz"""
+        with self._lock:
+            return {
+                "status": self.status,
+                "progress": self.progress,
+                "message": self.message,
+                "partial": dict(self.partial),
+                "result": self.result,
+                "error": self.error,
+            }
+
+    @property
+    def finished(self):
+        return self.status in (STATUS_DONE, STATUS_ERROR)
+
+
+class JobExecutor:
+    """Ejecuta trabajos largos fuera del hilo del script y los conserva entre reruns
+
+    Los trabajos se identifican por una clave (sesión + tipo de trabajo o
+    processing_id); enviar de nuevo una clave que sigue viva devuelve el
+    trabajo existente en lugar de duplicarlo.
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_age=DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, owner, func, *args, **kwargs):
+        """Lanza func(job, *args, **kwargs) salvo que ya exista un trabajo vivo con esa clave"""
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(key)
+            if job is not None and job.status != STATUS_ERROR:
+                return job
+            job = Job(key, owner)
+            self._jobs[key] = job
+
+        self._pool.submit(self._run, job, func, args, kwargs)
+        return job
+
+    def _run(self, job, func, args, kwargs):
+        job.status = STATUS_RUNNING
+        try:
+            result = func(job, *args, **kwargs)
+            with job._lock:
+                job.result = result
+                job.progress = 1.0
+                job.status = STATUS_DONE
+                job.updated_at = time.time()
+        except Exception as e:
+            with job._lock:
+                job.error = str(e)
+                job.status = STATUS_ERROR
+                job.updated_at = time.time()
+
+    def get(self, key):
+        """Devuelve el trabajo con esa clave o None"""
+        with self._lock:
+            return self._jobs.get(key)
+
+    def jobs_for(self, owner):
+        """Trabajos de un propietario (sesión)"""
+        with self._lock:
+            return [job for job in self._jobs.values() if job.owner == owner]
+
+    def discard(self, key):
+        """Olvida un trabajo (no cancela uno en curso)"""
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def _purge(self):
+        """Elimina trabajos terminados hace más de max_age segundos"""
+        cutoff = time.time() - self.max_age
+        for key in [k for k, job in self._jobs.items() if job.finished and job.updated_at < cutoff]:
+            del self._jobs[key]
@@ -0,0 +1,177 @@
+import json
+import re
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Cadenas JSON completas (se saltan en bloque) o delimitadores de objeto/array
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]]', re.DOTALL)
+_START_RE = re.compile(r'[{\[]')
+_FENCE_RE = re.compile(r'```[a-zA-Z]*[ \t]*\n?(.*?)```', re.DOTALL)
+_CLOSING = {'}': '{', ']': '['}
+
+
+class JSONExtractionError(ValueError):
+    """No se encontró un JSON válido en la respuesta del modelo"""
+
+
+def loads(content: str) -> Any:
+    """Parsea JSON con orjson si está disponible, o con json"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _balanced_end(text: str, start: int, stop: int) -> Tuple[Optional[int], Optional[int]]:
+    """Recorre una vez el objeto/array que empieza en start
+
+    Devuelve (fin, None) si cierra bien, (None, posición) si hay un
+    delimitador que no corresponde y (None, None) si el texto se acaba
+    antes de cerrarlo.
+    """
+    stack = []
+    for match in _TOKEN_RE.finditer(text, start, stop):
+        token = match.group()
+        if token in '{[':
+            stack.append(token)
+        elif token in _CLOSING:
+            if not stack or stack.pop() != _CLOSING[token]:
+                return None, match.start()
+            if not stack:
+                return match.end(), None
+    return None, None
+
+
+def _scan_region(text: str, region_start: int, region_end: int) -> Optional[Tuple[int, int, Any]]:
+    """Busca el primer JSON de primer nivel válido en text[region_start:region_end]
+
+    Cada carácter se recorre una sola vez: nunca se entra en un candidato
+    que ya falló. Los tramos entre corchetes sin comillas ("[nota]") se
+    consideran prosa y se saltan; un tramo con comillas que no parsea o
+    que no cierra es un JSON mal formado y se rechaza.
+    """
+    pos = region_start
+    while True:
+        start_match = _START_RE.search(text, pos, region_end)
+        if start_match is None:
+            return None
+        start = start_match.start()
+        end, mismatch = _balanced_end(text, start, region_end)
+
+        if end is None and mismatch is None:
+            raise JSONExtractionError("JSON incompleto: faltan delimitadores de cierre")
+
+        if end is not None:
+            try:
+                return start, end, loads(text[start:end])
+            except ValueError as e:
+                if '"' in text[start:end]:
+                    raise JSONExtractionError(f"JSON mal formado en la posición {start}: {e}") from e
+            pos = end
+        else:
+            if '"' in text[start:mismatch]:
+                raise JSONExtractionError(f"Delimitador '{text[mismatch]}' inesperado en la posición {mismatch}")
+            pos = mismatch + 1
+
+
+def _find_json(text: str) -> Tuple[int, int, Any]:
+    """Primer JSON válido: primero en los bloques ```json```, luego en todo el texto"""
+    for fence in _FENCE_RE.finditer(text):
+        found = _scan_region(text, fence.start(1), fence.end(1))
+        if found is not None:
+            return found
+    found = _scan_region(text, 0, len(text))
+    if found is None:
+        raise JSONExtractionError("No se encontró ningún objeto o array JSON")
+    return found
+
+
+def find_json_span(text: str) -> Tuple[int, int]:
+    """Localiza el primer objeto o array JSON válido en el texto
+
+    Busca primero dentro de los bloques ```json``` y después en todo el
+    texto; los corchetes de la prosa (p. ej. "[nota]") se saltan, pero un
+    JSON mal formado lanza JSONExtractionError. Devuelve (inicio, fin) para usar como text[inicio:fin].
+    """
+    start, end, _ = _find_json(text)
+    return start, end
+
+
+def extract_json(text: str) -> Any:
+    """Extrae y parsea el primer JSON válido de una respuesta de LLM"""
+    return _find_json(text)[2]
+
+
+class IncrementalFieldParser:
+    """Parser incremental de un objeto JSON que llega por fragmentos
+
+    Cada vez que se cierra un campo de primer nivel del objeto, feed()
+    lo devuelve ya parseado como (clave, valor).
+    """
+
+    def __init__(self):
+        self._buffer = []
+        self._length = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member_start = None
+        self._closed = False
+
+    def feed(self, chunk: str):
+        """Procesa un fragmento y devuelve la lista de campos completados"""
+        fields = []
+        if self._closed:
+            return fields
+
+        offset = self._length
+        self._buffer.append(chunk)
+        self._length += len(chunk)
+
+        for i, char in enumerate(chunk, offset):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                if self._depth > 0:
+                    self._in_string = True
+            elif char in '{[':
+                self._depth += 1
+                if self._depth == 1:
+                    if char != '{':
+                        # Solo se soportan objetos en el primer nivel
+                        self._closed = True
+                        return fields
+                    self._member_start = i + 1
+            elif char in '}]' and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    fields.extend(self._parse_member(i))
+                    self._closed = True
+                    return fields
+            elif char == ',' and self._depth == 1:
+                fields.extend(self._parse_member(i))
+                self._member_start = i + 1
+
+        return fields
+
+    def _parse_member(self, end):
+        """Parsea el miembro "clave": valor que termina en la posición end"""
+        text = ''.join(self._buffer)
+        self._buffer = [text]
+        member = text[self._member_start:end].strip()
+        if not member:
+            return []
+        try:
+            return list(loads('{' + member + '}').items())
+        except ValueError:
+            return []
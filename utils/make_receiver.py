@@ -0,0 +1,180 @@
+import hmac
+import secrets
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from utils.embedding_codec import decode_json_body
+
+DEFAULT_MAX_AGE = 3600
+
+# Tamaño máximo del cuerpo de un callback, antes y después de descomprimir
+MAX_CALLBACK_BYTES = 16 * 1024 * 1024
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+
+
+class ResultStore:
+    """Almacén thread-safe de resultados de Make indexados por processing_id"""
+
+    def __init__(self, max_age=DEFAULT_MAX_AGE):
+        self.max_age = max_age
+        self._results = {}
+        self._condition = threading.Condition()
+
+    def mark_pending(self, processing_id):
+        """Registra un trabajo enviado y devuelve el token secreto de su callback"""
+        token = secrets.token_urlsafe(24)
+        with self._condition:
+            self._purge()
+            self._results[processing_id] = (STATUS_PENDING, None, time.time(), token)
+        return token
+
+    def set_result(self, processing_id, success, response):
+        """Guarda el resultado de un trabajo y despierta a quien lo esté esperando"""
+        status = STATUS_DONE if success else STATUS_ERROR
+        with self._condition:
+            entry = self._results.get(processing_id)
+            token = entry[3] if entry is not None else None
+            self._results[processing_id] = (status, response, time.time(), token)
+            self._condition.notify_all()
+
+    def accepts_callback(self, processing_id, token):
+        """Indica si el trabajo está pendiente y el token del callback es el suyo"""
+        with self._condition:
+            entry = self._results.get(processing_id)
+        if entry is None or entry[0] != STATUS_PENDING or not token or entry[3] is None:
+            return False
+        return hmac.compare_digest(entry[3], token)
+
+    def get(self, processing_id):
+        """Devuelve (estado, respuesta) o None si el trabajo no se conoce"""
+        with self._condition:
+            entry = self._results.get(processing_id)
+            return None if entry is None else entry[:2]
+
+    def wait(self, processing_id, timeout):
+        """Espera hasta timeout segundos a que el trabajo deje de estar pendiente"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                entry = self._results.get(processing_id)
+                if entry is not None and entry[0] != STATUS_PENDING:
+                    return entry[:2]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None if entry is None else entry[:2]
+                self._condition.wait(remaining)
+
+    def discard(self, processing_id):
+        """Olvida un trabajo"""
+        with self._condition:
+            self._results.pop(processing_id, None)
+
+    def _purge(self):
+        """Elimina resultados antiguos"""
+        cutoff = time.time() - self.max_age
+        for processing_id in [pid for pid, entry in self._results.items() if entry[2] < cutoff]:
+            del self._results[processing_id]
+
+
+class PayloadTooLarge(ValueError):
+    """El cuerpo del callback supera el tamaño máximo"""
+
+
+def _gunzip(body, max_bytes):
+    """Descomprime gzip sin producir más de max_bytes (evita bombas de compresión)"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, max_bytes + 1)
+    if len(data) > max_bytes:
+        raise PayloadTooLarge(f"el cuerpo descomprimido supera {max_bytes} bytes")
+    return data
+
+
+class CallbackReceiver:
+    """Servidor HTTP local que recibe los cuestionarios terminados enviados por Make
+
+    Make debe hacer POST a la callback_url recibida en el payload
+    (http://<host>:<port>/make/<processing_id>?token=<token>) con el JSON del
+    cuestionario. Solo se aceptan resultados de trabajos pendientes con su
+    token, que se comprueba antes de leer el cuerpo; cuerpos mayores que
+    max_body_bytes (también una vez descomprimidos) se rechazan con 413.
+    Por defecto escucha solo en localhost (detrás de un proxy).
+    """
+
+    def __init__(self, result_store, host="127.0.0.1", port=8765, max_body_bytes=MAX_CALLBACK_BYTES):
+        self.result_store = result_store
+        self.host = host
+        self.port = port
+        self.max_body_bytes = max_body_bytes
+        self._server = None
+        self._thread = None
+
+    def start(self):
+        """Arranca el servidor en un hilo daemon"""
+        if self._server is not None:
+            return
+        self._server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Detiene el servidor"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+    def _make_handler(self):
+        result_store = self.result_store
+        max_body_bytes = self.max_body_bytes
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status):
+                self.send_response(status)
+                self.end_headers()
+
+            def do_POST(self):
+                url = urlsplit(self.path)
+                parts = [p for p in url.path.split("/") if p]
+                if len(parts) != 2 or parts[0] != "make":
+                    return self._reply(404)
+                processing_id = parts[1]
+                token = parse_qs(url.query).get("token", [None])[0] or self.headers.get("X-Callback-Token")
+
+                # El token se valida antes de leer o descomprimir nada del cuerpo
+                if not result_store.accepts_callback(processing_id, token):
+                    return self._reply(403)
+
+                try:
+                    length = int(self.headers.get("Content-Length") or 0)
+                except ValueError:
+                    return self._reply(400)
+                if length < 0:
+                    return self._reply(400)
+                if length > max_body_bytes:
+                    return self._reply(413)
+                body = self.rfile.read(length)
+
+                content_encoding = self.headers.get("Content-Encoding")
+                try:
+                    if content_encoding == "gzip":
+                        body = _gunzip(body, max_body_bytes)
+                    response = decode_json_body(body)
+                except PayloadTooLarge:
+                    return self._reply(413)
+                except (ValueError, zlib.error):
+                    response = body.decode("utf-8", errors="replace")
+
+                result_store.set_result(processing_id, True, response)
+                self._reply(200)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
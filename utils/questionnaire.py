@@ -0,0 +1,103 @@
+import pandas as pd
+from typing import Dict, Iterator, List, Optional
+
+# Campo interno -> (clave en el JSON de Make, columna del editor)
+FIELDS = {
+    'id': ('No. Pregunta', 'ID'),
+    'modulo': ('KPI base o Modulo', 'Módulo'),
+    'texto': ('Pregunta', 'Pregunta'),
+    'tipo': ('Tipo de respuesta', 'Tipo'),
+    'opciones': ('Opciones de respuesta', 'Opciones'),
+    'indicador': ('Indicador', 'Indicador'),
+    'logica': ('Lógica de programación', 'Lógica'),
+}
+
+# Orden de columnas de la exportación
+EXPORT_COLUMNS = ['modulo', 'id', 'texto', 'tipo', 'opciones', 'indicador', 'logica']
+
+# Separadores de opciones de respuesta en cada representación
+MAKE_OPTIONS_SEPARATOR = '\r\n'
+EDITOR_OPTIONS_SEPARATOR = ' | '
+EXPORT_OPTIONS_SEPARATOR = ', '
+
+
+class Questionnaire:
+    """Cuestionario en formato columnar: una lista por campo en lugar de un dict por pregunta"""
+
+    __slots__ = ('columns', 'metadata', 'extra')
+
+    def __init__(self, columns: Dict[str, List], metadata: Optional[Dict] = None, extra: Optional[Dict] = None):
+        self.columns = columns
+        self.metadata = metadata
+        self.extra = extra or {}
+
+    def __len__(self) -> int:
+        return len(self.columns['id'])
+
+    @classmethod
+    def from_make(cls, data: Dict) -> 'Questionnaire':
+        """Construye el cuestionario desde el JSON de Make"""
+        questions = data.get('questions', [])
+        columns = {
+            field: [q.get(make_key, '') for q in questions]
+            for field, (make_key, _) in FIELDS.items()
+        }
+        extra = {k: v for k, v in data.items() if k not in ('questions', 'metadata')}
+        return cls(columns, data.get('metadata'), extra)
+
+    def to_make(self) -> Dict:
+        """Convierte el cuestionario al formato JSON de Make"""
+        make_keys = [make_key for make_key, _ in FIELDS.values()]
+        values = [self.columns[field] for field in FIELDS]
+        data = dict(self.extra)
+        data['questions'] = [dict(zip(make_keys, row)) for row in zip(*values)]
+        if self.metadata is not None:
+            data['metadata'] = self.metadata
+        return data
+
+    def to_editor_frame(self) -> pd.DataFrame:
+        """Convierte el cuestionario al DataFrame del editor"""
+        frame = pd.DataFrame({
+            editor_col: self.columns[field] for field, (_, editor_col) in FIELDS.items()
+        })
+        # Preguntas sin número reciben un ID por posición
+        missing = frame['ID'].isna() | (frame['ID'] == '')
+        if missing.any():
+            positions = pd.Series(range(1, len(frame) + 1), index=frame.index)
+            frame.loc[missing, 'ID'] = 'P' + positions[missing].astype(str)
+        frame['Opciones'] = frame['Opciones'].fillna('').astype(str).str.replace(
+            MAKE_OPTIONS_SEPARATOR, EDITOR_OPTIONS_SEPARATOR, regex=False
+        )
+        return frame
+
+    def with_editor_frame(self, frame: pd.DataFrame) -> 'Questionnaire':
+        """Devuelve un nuevo cuestionario con las preguntas editadas"""
+        frame = frame.fillna('')
+        columns = {
+            field: frame[editor_col].tolist() for field, (_, editor_col) in FIELDS.items()
+        }
+        columns['opciones'] = frame['Opciones'].astype(str).str.replace(
+            EDITOR_OPTIONS_SEPARATOR, MAKE_OPTIONS_SEPARATOR, regex=False
+        ).tolist()
+
+        metadata = self.metadata
+        if metadata is not None:
+            metadata = {**metadata, 'totalQuestions': len(frame)}
+        return Questionnaire(columns, metadata, self.extra)
+
+    def to_export_frame(self) -> pd.DataFrame:
+        """Convierte el cuestionario al DataFrame de exportación"""
+        return self._export_frame(0, len(self))
+
+    def iter_export_frames(self, chunk_rows: int) -> Iterator[pd.DataFrame]:
+        """Genera el DataFrame de exportación por bloques de chunk_rows filas"""
+        for start in range(0, len(self), chunk_rows):
+            yield self._export_frame(start, min(start + chunk_rows, len(self)))
+
+    def _export_frame(self, start: int, stop: int) -> pd.DataFrame:
+        """DataFrame de exportación para las preguntas [start, stop)"""
+        frame = pd.DataFrame({field: self.columns[field][start:stop] for field in EXPORT_COLUMNS})
+        frame['opciones'] = frame['opciones'].fillna('').astype(str).str.replace(
+            MAKE_OPTIONS_SEPARATOR, EXPORT_OPTIONS_SEPARATOR, regex=False
+        ).str.strip()
+        return frame
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import numpy as np
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "ai_quest_cache", "questionnaires.sqlite3")
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_THRESHOLD = 0.95
+
+
+def _normalize_field(value):
+    """Normaliza un campo de metadatos para compararlo"""
+    return " ".join(str(value or "").split()).lower()
+
+
+class QuestionnaireCache:
+    """Cache de cuestionarios generados, consultado por similitud de embedding del brief
+
+    Un brief nuevo reutiliza un cuestionario si su similitud coseno supera
+    el umbral y coinciden tipo_estudio y marca.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_entries=DEFAULT_MAX_ENTRIES, threshold=DEFAULT_THRESHOLD):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS questionnaires (
+                    processing_id TEXT PRIMARY KEY,
+                    tipo_estudio TEXT NOT NULL,
+                    marca TEXT NOT NULL,
+                    embedding BLOB NOT NULL,
+                    json_response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_questionnaires_key ON questionnaires (tipo_estudio, marca)"
+            )
+
+    def lookup(self, embedding, metadata):
+        """Busca un cuestionario de un brief casi idéntico
+
+        Devuelve (similitud, processing_id, json_response) o None.
+        """
+        query = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return None
+        query = query / norm
+
+        tipo_estudio = _normalize_field(metadata.get("tipo_estudio"))
+        marca = _normalize_field(metadata.get("marca"))
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT processing_id, embedding FROM questionnaires WHERE tipo_estudio = ? AND marca = ?",
+                (tipo_estudio, marca)
+            ).fetchall()
+
+            best = None
+            if rows:
+                matrix = np.vstack([np.frombuffer(blob, dtype=np.float32) for _, blob in rows])
+                scores = (matrix @ query) / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+                index = int(np.argmax(scores))
+                if scores[index] >= self.threshold:
+                    best = (float(scores[index]), rows[index][0])
+
+            if best is None:
+                self.misses += 1
+                return None
+
+            score, processing_id = best
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE questionnaires SET last_used = ? WHERE processing_id = ?",
+                    (time.time(), processing_id)
+                )
+            json_response = self._conn.execute(
+                "SELECT json_response FROM questionnaires WHERE processing_id = ?", (processing_id,)
+            ).fetchone()[0]
+            self.hits += 1
+        return score, processing_id, json_response
+
+    def put(self, embedding, metadata, processing_id, json_response):
+        """Guarda un cuestionario generado y expulsa los menos usados"""
+        blob = np.asarray(embedding, dtype=np.float32).tobytes()
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO questionnaires
+                   (processing_id, tipo_estudio, marca, embedding, json_response, created_at, last_used)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (processing_id, _normalize_field(metadata.get("tipo_estudio")),
+                 _normalize_field(metadata.get("marca")), blob, json_response, now, now)
+            )
+            self._conn.execute(
+                """DELETE FROM questionnaires WHERE processing_id IN (
+                    SELECT processing_id FROM questionnaires ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,)
+            )
+
+    def stats(self):
+        """Devuelve contadores de aciertos, fallos y número de entradas"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM questionnaires").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": entries,
+            }
@@ -0,0 +1,234 @@
+import random
+import threading
+import time
+
+# Errores de conexión por tipo; cada cliente HTTP es opcional
+_CONNECTION_ERRORS = (ConnectionError, TimeoutError)
+# Errores en los que la petición no llegó a enviarse
+_UNSENT_ERRORS = (ConnectionRefusedError,)
+
+try:
+    import requests
+    _CONNECTION_ERRORS += (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    _UNSENT_ERRORS += (requests.exceptions.ConnectTimeout,)
+except ImportError:
+    pass
+
+try:
+    from urllib3.exceptions import NewConnectionError
+    _UNSENT_ERRORS += (NewConnectionError,)
+except ImportError:
+    pass
+
+try:
+    import openai
+    _CONNECTION_ERRORS += (openai.APIConnectionError,)
+except ImportError:
+    pass
+
+try:
+    import httpx
+    _UNSENT_ERRORS += (httpx.ConnectError, httpx.ConnectTimeout)
+except ImportError:
+    pass
+
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_BASE_DELAY = 1.0
+DEFAULT_MAX_DELAY = 60.0
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# Tokens por minuto de chat: con este valor caben METADATA_MAP_CONCURRENCY
+# secciones de METADATA_SECTION_TOKENS a la vez; con uno menor las secciones
+# se reducen hasta caber en él (ver AIService._metadata_sizes)
+DEFAULT_CHAT_TPM = 150000
+
+# Límites por defecto: (peticiones por minuto, tokens por minuto, llamadas simultáneas)
+DEFAULT_LIMITS = {
+    "chat": (500, DEFAULT_CHAT_TPM, 8),
+    "embeddings": (3000, 1000000, 8),
+    "make": (60, None, 4),
+}
+
+
+def _status_code(exc):
+    """Código HTTP de un error de OpenAI o requests, si lo tiene"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status
+
+
+def is_retryable(exc):
+    """Indica si un error merece reintento (429, 5xx o fallo de conexión)"""
+    status = _status_code(exc)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(exc, _CONNECTION_ERRORS)
+
+
+def _causes(exc, limit=8):
+    """El error y los que lo provocaron (__cause__, args[0] de requests, reason de urllib3)"""
+    seen = set()
+    while exc is not None and id(exc) not in seen and len(seen) < limit:
+        seen.add(id(exc))
+        yield exc
+        if exc.__cause__ is not None:
+            exc = exc.__cause__
+        elif getattr(exc, "reason", None) is not None and isinstance(exc.reason, BaseException):
+            exc = exc.reason
+        elif exc.args and isinstance(exc.args[0], BaseException):
+            exc = exc.args[0]
+        else:
+            exc = None
+
+
+def is_retryable_unsent(exc):
+    """Reintento seguro para endpoints no idempotentes: solo 429 o fallo al conectar
+
+    Un timeout de lectura, una conexión cortada ("Connection aborted") o un
+    5xx pueden llegar después de que el servidor ya haya recibido la
+    petición, así que no se reintentan.
+    """
+    status = _status_code(exc)
+    if status is not None:
+        return status == 429
+    return any(isinstance(cause, _UNSENT_ERRORS) for cause in _causes(exc))
+
+
+# Política de reintento por endpoint (por defecto is_retryable)
+RETRY_POLICIES = {
+    "make": is_retryable_unsent,
+}
+
+
+def _retry_after(exc):
+    """Segundos indicados por la cabecera Retry-After, si existe"""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Cubeta de tokens thread-safe; los que esperan se atienden de uno en uno"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._queue = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount=1):
+        """Consume amount tokens, esperando en cola si no hay suficientes
+
+        Una petición mayor que la capacidad nunca podría cumplir el límite:
+        se rechaza con ValueError en lugar de recortarla en silencio.
+        """
+        amount = float(amount)
+        if amount > self.capacity:
+            raise ValueError(
+                f"la petición necesita {amount:.0f} tokens y el límite es {self.capacity:.0f} por minuto"
+            )
+        with self._queue:
+            while True:
+                with self._lock:
+                    self._refill()
+                    if self._tokens >= amount:
+                        self._tokens -= amount
+                        return
+                    wait = (amount - self._tokens) / self.rate
+                time.sleep(wait)
+
+
+class EndpointLimiter:
+    """Limita peticiones y tokens por minuto y llamadas simultáneas de un endpoint"""
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None, max_concurrency=4,
+                 max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 retryable=is_retryable):
+        self.requests = TokenBucket(requests_per_minute)
+        self.retryable = retryable
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._stats_lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+
+    def _backoff(self, attempt, exc):
+        """Espera antes del siguiente intento: Retry-After o exponencial con jitter completo"""
+        retry_after = _retry_after(exc)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def call(self, func, *args, tokens=0, consume=None, **kwargs):
+        """Ejecuta func respetando los límites y reintentando errores transitorios
+
+        Si se indica consume, consume(resultado) se ejecuta sin soltar el hueco
+        de concurrencia (respuestas en streaming) y sus errores también se
+        reintentan.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.requests.acquire(1)
+            if self.tokens is not None and tokens:
+                self.tokens.acquire(tokens)
+
+            with self._slots:
+                try:
+                    result = func(*args, **kwargs)
+                    if consume is not None:
+                        result = consume(result)
+                    with self._stats_lock:
+                        self.calls += 1
+                    return result
+                except Exception as e:
+                    if attempt >= self.max_retries or not self.retryable(e):
+                        with self._stats_lock:
+                            self.failures += 1
+                        raise
+                    delay = self._backoff(attempt, e)
+
+            with self._stats_lock:
+                self.retries += 1
+            time.sleep(delay)
+
+    def stats(self):
+        """Devuelve contadores de llamadas, reintentos y fallos"""
+        with self._stats_lock:
+            return {"calls": self.calls, "retries": self.retries, "failures": self.failures}
+
+
+class RateLimiter:
+    """Registro de limitadores por endpoint compartido por todo el proceso"""
+
+    def __init__(self, limits=None):
+        self._limiters = {
+            endpoint: EndpointLimiter(rpm, tpm, concurrency, retryable=RETRY_POLICIES.get(endpoint, is_retryable))
+            for endpoint, (rpm, tpm, concurrency) in {**DEFAULT_LIMITS, **(limits or {})}.items()
+        }
+
+    def call(self, endpoint, func, *args, tokens=0, consume=None, **kwargs):
+        """Ejecuta func bajo el limitador del endpoint indicado"""
+        return self._limiters[endpoint].call(func, *args, tokens=tokens, consume=consume, **kwargs)
+
+    def token_capacity(self, endpoint):
+        """Tokens por minuto del endpoint (tamaño máximo de una petición), o None si no se limitan"""
+        tokens = self._limiters[endpoint].tokens
+        return tokens.capacity if tokens is not None else None
+
+    def stats(self):
+        """Estadísticas de todos los endpoints"""
+        return {endpoint: limiter.stats() for endpoint, limiter in self._limiters.items()}
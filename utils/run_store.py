@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+DEFAULT_DB_PATH = os.path.join(tempfile.gettempdir(), "ai_quest_cache", "runs.sqlite3")
+DEFAULT_MAX_RUNS = 500
+
+# Etapas del flujo en orden; cada una guarda su salida en JSON
+STAGE_EXTRACT = "extract"
+STAGE_ANALYZE = "analyze"
+STAGE_REVIEW = "review"
+STAGE_GENERATE = "generate"
+STAGE_EDIT = "edit"
+STAGES = (STAGE_EXTRACT, STAGE_ANALYZE, STAGE_REVIEW, STAGE_GENERATE, STAGE_EDIT)
+
+
+class RunStore:
+    """Almacén persistente de ejecuciones del flujo y de la salida de cada etapa
+
+    Una ejecución se identifica por el hash del contenido de los documentos
+    y de su propietario (mismo usuario y documentos, misma ejecución) y puede
+    buscarse también por el processing_id de Make. Cada propietario solo ve
+    y reabre sus propias ejecuciones. Sobrevive a reinicios del servidor y a
+    reinicios de la sesión.
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, max_runs=DEFAULT_MAX_RUNS):
+        self.db_path = db_path
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL DEFAULT '',
+                    processing_id TEXT,
+                    label TEXT NOT NULL DEFAULT '',
+                    stage TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS stages (
+                    run_id TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (run_id, stage)
+                )"""
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(runs)")}
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE runs ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_owner ON runs (owner, updated_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_processing_id ON runs (processing_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_updated_at ON runs (updated_at)")
+
+    @staticmethod
+    def make_run_id(documents, owner=""):
+        """Hash del propietario y del contenido de los documentos: lista de (rol, bytes)"""
+        digest = hashlib.sha256()
+        digest.update(f"{owner}\0".encode("utf-8"))
+        for role, data in documents:
+            digest.update(f"{role}\0{len(data)}\0".encode("utf-8"))
+            digest.update(data)
+        return digest.hexdigest()
+
+    def open_run(self, run_id, owner="", label=""):
+        """Crea la ejecución si no existe y devuelve su run_id"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO runs (run_id, owner, label, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (run_id, owner, label, now, now)
+            )
+            self._conn.execute(
+                """DELETE FROM runs WHERE run_id IN (
+                    SELECT run_id FROM runs ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_runs,)
+            )
+            self._conn.execute("DELETE FROM stages WHERE run_id NOT IN (SELECT run_id FROM runs)")
+        return run_id
+
+    def save_stage(self, run_id, stage, value, label=None):
+        """Guarda la salida (serializable en JSON) de una etapa de la ejecución"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO stages (run_id, stage, value, updated_at) VALUES (?, ?, ?, ?)",
+                (run_id, stage, json.dumps(value, ensure_ascii=False), now)
+            )
+            self._conn.execute(
+                "UPDATE runs SET stage = ?, label = COALESCE(?, label), updated_at = ? WHERE run_id = ?",
+                (stage, label, now, run_id)
+            )
+
+    def set_processing_id(self, run_id, processing_id):
+        """Asocia el processing_id de Make a la ejecución"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE runs SET processing_id = ?, updated_at = ? WHERE run_id = ?",
+                (processing_id, time.time(), run_id)
+            )
+
+    def load(self, run_id, owner=None):
+        """Devuelve {etapa: salida} de la ejecución, o None si no existe (o es de otro propietario)"""
+        with self._lock:
+            row = self._conn.execute("SELECT owner FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None or (owner is not None and row[0] != owner):
+                return None
+            rows = self._conn.execute(
+                "SELECT stage, value FROM stages WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {stage: json.loads(value) for stage, value in rows}
+
+    def find_by_processing_id(self, processing_id, owner=""):
+        """run_id de la ejecución del propietario enviada a Make con ese processing_id, o None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id FROM runs WHERE processing_id = ? AND owner = ? ORDER BY updated_at DESC LIMIT 1",
+                (processing_id, owner)
+            ).fetchone()
+        return row[0] if row else None
+
+    def reset(self, run_id, from_stage=STAGE_EXTRACT):
+        """Descarta la salida de from_stage y de las etapas posteriores"""
+        dropped = STAGES[STAGES.index(from_stage):]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM stages WHERE run_id = ? AND stage = ?",
+                [(run_id, stage) for stage in dropped]
+            )
+            self._conn.execute(
+                """UPDATE runs SET stage = (
+                    SELECT stage FROM stages WHERE stages.run_id = runs.run_id
+                    ORDER BY updated_at DESC LIMIT 1
+                ), updated_at = ? WHERE run_id = ?""",
+                (time.time(), run_id)
+            )
+
+    def recent(self, owner="", limit=10):
+        """Ejecuciones más recientes del propietario con alguna etapa completada"""
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT run_id, processing_id, label, stage, updated_at FROM runs
+                WHERE owner = ? AND stage IS NOT NULL ORDER BY updated_at DESC LIMIT ?""",
+                (owner, limit)
+            ).fetchall()
+        keys = ("run_id", "processing_id", "label", "stage", "updated_at")
+        return [dict(zip(keys, row)) for row in rows]
@@ -0,0 +1,132 @@
+import mmap
+import os
+import sys
+import tempfile
+import weakref
+import numpy as np
+
+DEFAULT_SPILL_DIR = os.path.join(tempfile.gettempdir(), "ai_quest_cache", "session_text")
+
+# Textos a partir de este tamaño (bytes UTF-8) se guardan en disco y no en la sesión
+DEFAULT_SPILL_THRESHOLD = 256 * 1024
+
+# Máximo de bytes UTF-8 por carácter: basta leer n * 4 bytes para obtener n caracteres
+_MAX_CHAR_BYTES = 4
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class SpilledText:
+    """Texto largo guardado en un archivo temporal y leído con mmap solo al usarlo
+
+    Los textos cortos se mantienen en memoria. El archivo se borra cuando el
+    objeto deja de estar referenciado (p. ej. al cerrarse la sesión).
+    """
+
+    def __init__(self, text="", spill_dir=DEFAULT_SPILL_DIR, threshold=DEFAULT_SPILL_THRESHOLD):
+        data = text.encode("utf-8")
+        self._length = len(text)
+        self._size = len(data)
+        self._text = None
+        self.path = None
+
+        if self._size < threshold:
+            self._text = text
+            return
+
+        os.makedirs(spill_dir, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=".txt", dir=spill_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        weakref.finalize(self, _remove_file, self.path)
+
+    def _read_bytes(self, limit=None):
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return mapped[:limit] if limit is not None else mapped[:]
+
+    def read(self):
+        """Devuelve el texto completo"""
+        if self.path is None:
+            return self._text
+        return self._read_bytes().decode("utf-8")
+
+    def preview(self, chars=500):
+        """Primeros caracteres del texto sin cargarlo entero"""
+        if self.path is None:
+            return self._text[:chars]
+        return self._read_bytes(chars * _MAX_CHAR_BYTES).decode("utf-8", errors="ignore")[:chars]
+
+    @property
+    def spilled(self):
+        return self.path is not None
+
+    @property
+    def resident_bytes(self):
+        """Bytes que ocupa en memoria (el texto si no se volcó a disco)"""
+        return sys.getsizeof(self._text) if self._text is not None else sys.getsizeof(self.path)
+
+    @property
+    def disk_bytes(self):
+        return self._size if self.path is not None else 0
+
+    def __len__(self):
+        return self._length
+
+    def __bool__(self):
+        return self._length > 0
+
+    def __str__(self):
+        return self.read()
+
+
+def pack_embedding(embedding):
+    """Embedding como array float32 contiguo (4 bytes por valor en vez de una lista de floats)"""
+    if embedding is None:
+        return None
+    return np.ascontiguousarray(embedding, dtype=np.float32)
+
+
+def _sizeof(value, seen):
+    """Tamaño aproximado en memoria de un valor y de lo que contiene"""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, SpilledText):
+        return value.resident_bytes
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):
+        # DataFrame de pandas
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "getbuffer"):
+        # Archivos subidos (BytesIO)
+        return value.getbuffer().nbytes
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_sizeof(k, seen) + _sizeof(v, seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(_sizeof(item, seen) for item in value)
+    elif hasattr(value, "__slots__"):
+        size += sum(_sizeof(getattr(value, slot), seen) for slot in value.__slots__ if hasattr(value, slot))
+    elif hasattr(value, "__dict__"):
+        size += _sizeof(vars(value), seen)
+    return size
+
+
+def session_memory_usage(state):
+    """Bytes aproximados en memoria por clave de la sesión, de mayor a menor"""
+    seen = set()
+    usage = {}
+    for key in list(state.keys()):
+        try:
+            usage[key] = _sizeof(state[key], seen)
+        except Exception:
+            usage[key] = 0
+    return dict(sorted(usage.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,117 @@
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+from utils.ai_service import count_tokens
+from utils.document_processor import PDF_PAGE_SEPARATOR
+
+# Líneas que solo contienen un número de página ("3", "- 3 -", "Página 3 de 10", "3/10")
+_PAGE_NUMBER_RE = re.compile(r'^[-–—\s]*(?:p[aá]g(?:ina)?\.?|page)?\s*\d+\s*(?:(?:de|of|/)\s*\d+)?[-–—\s]*$', re.IGNORECASE)
+_DIGITS_RE = re.compile(r'\d+')
+_SPACES_RE = re.compile(r'[ \t\v\u00a0]+')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+
+# Una línea corta que se repite en el borde de al menos estas páginas es encabezado o pie
+HEADER_MIN_REPEATS = 3
+HEADER_MAX_CHARS = 100
+
+# Solo se deduplican párrafos con al menos esta longitud
+DEDUP_MIN_CHARS = 40
+
+# Caracteres por token para el informe si no se pueden contar
+_CHARS_PER_TOKEN = 4
+
+
+def _line_signature(line: str) -> str:
+    """Firma de una línea ignorando números (para encabezados con número de página)"""
+    return _DIGITS_RE.sub('#', ' '.join(line.split()).lower())
+
+
+def _report_tokens(text: str) -> int:
+    """Tokens para el informe: es solo informativo y nunca debe romper la compactación"""
+    try:
+        return count_tokens(text)
+    except Exception:
+        return -(-len(text) // _CHARS_PER_TOKEN)
+
+
+class TextCompactor:
+    """Normaliza y deduplica el texto de los documentos antes de enviarlo a la IA"""
+
+    def __init__(self, header_min_repeats=HEADER_MIN_REPEATS, dedup_min_chars=DEDUP_MIN_CHARS):
+        self.header_min_repeats = header_min_repeats
+        self.dedup_min_chars = dedup_min_chars
+
+    def _collapse_whitespace(self, text: str) -> List[str]:
+        """Colapsa espacios y devuelve las líneas sin espacios sobrantes"""
+        return [_SPACES_RE.sub(' ', line).strip() for line in text.splitlines()]
+
+    def _boundary_indexes(self, lines: List[str]) -> List[int]:
+        """Posiciones de la primera y la última línea no vacía de una página"""
+        filled = [i for i, line in enumerate(lines) if line]
+        return sorted({filled[0], filled[-1]}) if filled else []
+
+    def _strip_headers_footers(self, pages: List[List[str]]) -> List[List[str]]:
+        """Elimina números de página y encabezados/pies repetidos en los bordes de página
+
+        Solo se miran la primera y la última línea de cada página; el resto del
+        contenido (tablas, cifras sueltas) nunca se toca.
+        """
+        boundaries = [self._boundary_indexes(lines) for lines in pages]
+        signatures = Counter(
+            sig
+            for lines, indexes in zip(pages, boundaries)
+            for sig in {_line_signature(lines[i]) for i in indexes if len(lines[i]) <= HEADER_MAX_CHARS}
+        )
+        repeated = {sig for sig, count in signatures.items() if count >= self.header_min_repeats}
+
+        stripped = []
+        for lines, indexes in zip(pages, boundaries):
+            drop = {
+                i for i in indexes
+                if _PAGE_NUMBER_RE.match(lines[i])
+                or (len(lines[i]) <= HEADER_MAX_CHARS and _line_signature(lines[i]) in repeated)
+            }
+            stripped.append([line for i, line in enumerate(lines) if i not in drop])
+        return stripped
+
+    def compact(self, documents: List[str]) -> Tuple[List[str], List[Dict]]:
+        """Compacta una lista de documentos
+
+        Devuelve los textos compactados y, por documento, los tokens antes y
+        después y los ahorrados. Los encabezados y pies solo se buscan en texto
+        paginado (PDF); los párrafos largos que ya aparecieron en un documento
+        anterior (p. ej. el brief copiado en el KO) se eliminan.
+        """
+        seen = set()
+        compacted = []
+        report = []
+
+        for text in documents:
+            pages = [self._collapse_whitespace(page) for page in text.split(PDF_PAGE_SEPARATOR)]
+            if len(pages) > 1:
+                pages = self._strip_headers_footers(pages)
+            lines = [line for page in pages for line in page]
+
+            kept = []
+            current = set()
+            for line in lines:
+                if len(line) >= self.dedup_min_chars:
+                    key = ' '.join(line.split()).lower()
+                    if key in seen:
+                        continue
+                    current.add(key)
+                kept.append(line)
+            seen |= current
+
+            result = _BLANK_LINES_RE.sub('\n\n', '\n'.join(kept)).strip()
+            compacted.append(result)
+
+            tokens_before = _report_tokens(text)
+            tokens_after = _report_tokens(result)
+            report.append({
+                'tokens_antes': tokens_before,
+                'tokens_despues': tokens_after,
+                'tokens_ahorrados': tokens_before - tokens_after,
+            })
+
+        return compacted, report
@@ -0,0 +1,108 @@
+import json
+import os
+import tempfile
+import threading
+import numpy as np
+
+DEFAULT_INDEX_DIR = os.path.join(tempfile.gettempdir(), "ai_quest_cache", "brief_index")
+DEFAULT_DIM = 1536
+
+
+class VectorIndex:
+    """Índice vectorial local de briefs: matriz float32 normalizada en disco + metadatos en JSONL
+
+    Los vectores se añaden al final de un archivo binario que se lee con
+    memoria mapeada; la búsqueda por coseno es un producto matricial.
+    """
+
+    def __init__(self, index_dir=DEFAULT_INDEX_DIR, dim=DEFAULT_DIM):
+        self.index_dir = index_dir
+        self.dim = dim
+        self._vectors_path = os.path.join(index_dir, "vectors.f32")
+        self._metadata_path = os.path.join(index_dir, "metadata.jsonl")
+        self._lock = threading.Lock()
+        self._matrix = None
+
+        os.makedirs(index_dir, exist_ok=True)
+        self._metadata = []
+        if os.path.exists(self._metadata_path):
+            with open(self._metadata_path, "r", encoding="utf-8") as f:
+                self._metadata = [json.loads(line) for line in f if line.strip()]
+
+    def __len__(self):
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        """Número de filas completas (vector + metadatos)"""
+        if not os.path.exists(self._vectors_path):
+            return 0
+        rows = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        return min(rows, len(self._metadata))
+
+    def _normalize(self, vectors):
+        """Normaliza filas a norma unitaria"""
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def add(self, vector, metadata):
+        """Añade un vector con sus metadatos y devuelve su posición"""
+        return self.add_many([vector], [metadata])[0]
+
+    def add_many(self, vectors, metadatas):
+        """Añade varios vectores de una vez y devuelve sus posiciones"""
+        matrix = self._normalize(vectors)
+        if len(matrix) != len(metadatas):
+            raise ValueError("El número de vectores y de metadatos no coincide")
+
+        with self._lock:
+            start = self._count()
+            # Descartar filas huérfanas de una escritura interrumpida
+            if os.path.exists(self._vectors_path):
+                with open(self._vectors_path, "r+b") as f:
+                    f.truncate(start * self.dim * 4)
+            rewrite_metadata = len(self._metadata) != start
+            self._metadata = self._metadata[:start]
+
+            with open(self._vectors_path, "ab") as f:
+                f.write(matrix.astype("<f4").tobytes())
+
+            if rewrite_metadata:
+                with open(self._metadata_path, "w", encoding="utf-8") as f:
+                    for metadata in self._metadata + list(metadatas):
+                        f.write(json.dumps(metadata, ensure_ascii=False) + "\n")
+            else:
+                with open(self._metadata_path, "a", encoding="utf-8") as f:
+                    for metadata in metadatas:
+                        f.write(json.dumps(metadata, ensure_ascii=False) + "\n")
+
+            self._metadata.extend(metadatas)
+            self._matrix = None
+            return list(range(start, start + len(metadatas)))
+
+    def _load_matrix(self):
+        """Mapea en memoria la matriz de vectores"""
+        if self._matrix is None:
+            count = self._count()
+            if count == 0:
+                return None
+            self._matrix = np.memmap(self._vectors_path, dtype="<f4", mode="r", shape=(count, self.dim))
+        return self._matrix
+
+    def search(self, query, k=5):
+        """Devuelve los k vecinos más similares como lista de (similitud, metadatos)"""
+        query = self._normalize(query)[0]
+
+        with self._lock:
+            matrix = self._load_matrix()
+            if matrix is None:
+                return []
+            metadata = self._metadata
+
+            scores = matrix @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[i]), metadata[i]) for i in top]
@@ -1,25 +1,64 @@
 import requests
 import streamlit as st
 import json
+import threading
+from utils.make_receiver import ResultStore
+from utils.embedding_codec import encode_embedding, encode_json_body
+
+DEFAULT_WEBHOOK_URL = "https://hook.us2.make.com/a18h6yc94x6rp6s1m7do3tij3xontr85"
+
+# Timeout del POST cuando Make devuelve el resultado por callback
+SUBMIT_TIMEOUT = 30
 
 class WebhookHandler:
     """Maneja el envío y recepción de webhooks con Make"""
     
-    def __init__(self):
-        self.webhook_url = "https://hook.us2.make.com/a18h6yc94x6rp6s1m7do3tij3xontr85"
+    def __init__(self, session=None, timeout=180, webhook_url=DEFAULT_WEBHOOK_URL,
+                 result_store=None, executor=None, callback_url=None,
+                 embedding_encoding=None, compress=False, rate_limiter=None):
+        self.webhook_url = webhook_url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.result_store = result_store or ResultStore()
+        self.executor = executor
+        self.callback_url = callback_url
+        self.embedding_encoding = embedding_encoding
+        self.compress = compress
+        self.rate_limiter = rate_limiter
     
-    def send_to_make(self, embedding, metadata, processing_id):
-        """Envía datos al webhook de Make y recibe la respuesta JSON"""
-        payload = {
+    def _build_payload(self, embedding, metadata, processing_id):
+        """Construye el cuerpo de la petición a Make"""
+        if self.embedding_encoding and embedding is not None:
+            embedding = encode_embedding(embedding, self.embedding_encoding)
+        elif hasattr(embedding, "tolist"):
+            # Embedding empaquetado (array float32) sin codificación: lista JSON
+            embedding = embedding.tolist()
+        return {
             "embedding": embedding,
             "brief_name": f"{processing_id}.docx",
             "metadata": metadata,
             "processing_id": processing_id
         }
+    
+    def _post(self, payload, timeout):
+        """Envía el payload como JSON compacto (gzip opcional) y valida el estado HTTP"""
+        body, headers = encode_json_body(payload, compress=self.compress)
         
-        try:
-            response = requests.post(self.webhook_url, json=payload, timeout=180)
+        def post():
+            response = self.session.post(self.webhook_url, data=body, headers=headers, timeout=timeout)
             response.raise_for_status()
+            return response
+        
+        if self.rate_limiter is None:
+            return post()
+        return self.rate_limiter.call("make", post)
+    
+    def send_to_make(self, embedding, metadata, processing_id):
+        """Envía datos al webhook de Make y recibe la respuesta JSON"""
+        payload = self._build_payload(embedding, metadata, processing_id)
+        
+        try:
+            response = self._post(payload, self.timeout)
             
             # Intentar extraer JSON de la respuesta
             try:
@@ -33,8 +72,43 @@ class WebhookHandler:
         except requests.exceptions.RequestException as e:
             return False, f"Error al enviar datos: {str(e)}"
     
-    def receive_from_make(self, processing_id):
-        """Recibe respuesta de Make (implementar según tu API)"""
-        # Esta función se implementaría para recibir la respuesta JSON
-        # desde Make una vez procesado el cuestionario
-        pass
\ No newline at end of file
+    def submit_to_make(self, embedding, metadata, processing_id):
+        """Envía el trabajo a Make sin bloquear y devuelve (éxito, processing_id o error)
+        
+        Con callback_url, Make entrega el cuestionario al receptor local; sin él,
+        la llamada síncrona se ejecuta en segundo plano. En ambos casos el
+        resultado acaba en result_store y se consulta con receive_from_make.
+        """
+        token = self.result_store.mark_pending(processing_id)
+        
+        if self.callback_url:
+            payload = self._build_payload(embedding, metadata, processing_id)
+            payload["callback_url"] = f"{self.callback_url.rstrip('/')}/make/{processing_id}?token={token}"
+            try:
+                self._post(payload, SUBMIT_TIMEOUT)
+                return True, processing_id
+            except requests.exceptions.RequestException as e:
+                error = f"Error al enviar datos: {str(e)}"
+                self.result_store.set_result(processing_id, False, error)
+                return False, error
+        
+        def run():
+            success, response = self.send_to_make(embedding, metadata, processing_id)
+            self.result_store.set_result(processing_id, success, response)
+        
+        if self.executor is not None:
+            self.executor.submit(run)
+        else:
+            threading.Thread(target=run, daemon=True).start()
+        return True, processing_id
+    
+    def receive_from_make(self, processing_id, timeout=0):
+        """Consulta el resultado de un trabajo enviado con submit_to_make
+        
+        Devuelve (estado, respuesta) con estado "pending", "done" o "error",
+        o None si el processing_id no se conoce. Con timeout > 0 espera
+        hasta ese número de segundos a que termine.
+        """
+        if timeout > 0:
+            return self.result_store.wait(processing_id, timeout)
+        return self.result_store.get(processing_id)
\ No newline at end of file